@@ -0,0 +1,71 @@
+import os
+import re
+import orjson
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Any
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Redis is used when configured so the cache is shared across workers;
+# otherwise fall back to a small in-process LRU
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+LOCAL_CACHE_MAX_ENTRIES = 256
+KEY_PREFIX = "rg:sha256:"
+
+_whitespace_re = re.compile(r"\s+")
+
+if REDIS_URL:
+    import redis.asyncio as redis
+    _redis = redis.from_url(REDIS_URL)
+else:
+    _redis = None
+
+_local_cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+def content_key(text_content: str, version: str = "") -> str:
+    """Return the cache key for a document's normalized text.
+
+    ``version`` identifies the model and prompt that produced the result,
+    so changing either stops old parses from being served.
+    """
+    normalized = _whitespace_re.sub(" ", text_content).strip()
+    return KEY_PREFIX + version + ":" + hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+async def get_parsed_content(text_content: str, version: str = "") -> Optional[Dict[str, Any]]:
+    """Look up a previously parsed routing guide with the same text."""
+    key = content_key(text_content, version)
+    try:
+        if _redis is not None:
+            cached = await _redis.get(key)
+        else:
+            cached = _local_cache.get(key)
+            if cached is not None:
+                _local_cache.move_to_end(key)
+    except Exception as e:
+        logger.warning(f"AI cache lookup failed: {str(e)}")
+        return None
+
+    if cached is None:
+        return None
+    return orjson.loads(cached)
+
+async def set_parsed_content(text_content: str, parsed_content: Dict[str, Any], version: str = ""):
+    """Store the parsed result for a routing guide's text."""
+    key = content_key(text_content, version)
+    value = orjson.dumps(parsed_content)
+    try:
+        if _redis is not None:
+            await _redis.set(key, value, ex=CACHE_TTL_SECONDS)
+        else:
+            _local_cache[key] = value
+            _local_cache.move_to_end(key)
+            while len(_local_cache) > LOCAL_CACHE_MAX_ENTRIES:
+                _local_cache.popitem(last=False)
+    except Exception as e:
+        logger.warning(f"AI cache store failed: {str(e)}")
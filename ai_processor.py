@@ -1,48 +1,158 @@
 import os
-import json
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import orjson
 import fitz  # PyMuPDF
+from concurrent.futures import ProcessPoolExecutor
+import httpx
+import diskcache
+import tiktoken
+import ahocorasick
 import openai
 import anthropic
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any
 from docx import Document
 from dotenv import load_dotenv
+import ai_cache
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Initialize API clients
-openai.api_key = os.getenv("OPENAI_API_KEY")
-anthropic_client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+
+# One pooled HTTP/2 client shared by both SDKs so connections and TLS
+# sessions are reused across calls
+http_client = httpx.AsyncClient(
+    http2=True,
+    timeout=60,
+    limits=httpx.Limits(max_keepalive_connections=32)
+)
+
+openai_client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client) if OPENAI_API_KEY else None
+anthropic_client = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY, http_client=http_client) if ANTHROPIC_API_KEY else None
+
+# PDFs shorter than this are extracted in-process; process start-up and
+# pickling costs outweigh the parallel speedup on small documents
+PARALLEL_PDF_MIN_PAGES = 4
+
+_pdf_executor: Optional[ProcessPoolExecutor] = None
+
+def _get_pdf_executor() -> ProcessPoolExecutor:
+    """Return the shared process pool used for PDF extraction."""
+    global _pdf_executor
+    if _pdf_executor is None:
+        # forkserver children don't inherit the server's event loop, threads
+        # or open sockets the way fork children would
+        _pdf_executor = ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context("forkserver")
+        )
+    return _pdf_executor
+
+# Plain text extraction without ligature preservation; ligatures are expanded
+# to their component characters, which is what the LLM prompt wants anyway
+_PDF_TEXT_FLAGS = fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+
+def _extract_pages(file_path: str, start: int, end: int) -> str:
+    """Extract text for pages ``[start, end)`` of a PDF."""
+    doc = fitz.open(file_path)
+    parts = []
+    
+    for page_num in range(start, end):
+        page = doc.load_page(page_num)
+        parts.append(page.get_text("text", flags=_PDF_TEXT_FLAGS))
+    
+    doc.close()
+    return "\n\n".join(parts)  # Add spacing between pages
 
 def extract_text_from_pdf(file_path: str) -> str:
     """Extract text content from PDF using PyMuPDF."""
     try:
-        doc = fitz.open(file_path)
-        text = ""
+        with fitz.open(file_path) as doc:
+            page_count = len(doc)
         
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text += page.get_text()
-            text += "\n\n"  # Add spacing between pages
+        workers = os.cpu_count() or 1
+        if page_count < PARALLEL_PDF_MIN_PAGES or workers == 1:
+            return _extract_pages(file_path, 0, page_count).strip()
         
-        doc.close()
-        return text.strip()
+        # Shard page ranges across worker processes and join in page order
+        chunk_size = -(-page_count // workers)
+        executor = _get_pdf_executor()
+        futures = [
+            executor.submit(_extract_pages, file_path, start, min(start + chunk_size, page_count))
+            for start in range(0, page_count, chunk_size)
+        ]
+        
+        return "\n\n".join(future.result() for future in futures).strip()
     except Exception as e:
         raise Exception(f"Failed to extract text from PDF: {str(e)}")
 
+async def close_http_client():
+    """Close the shared HTTP client used by the AI provider SDKs."""
+    await http_client.aclose()
+
+def shutdown_pdf_executor():
+    """Shut down the PDF extraction process pool, if it was started."""
+    global _pdf_executor
+    if _pdf_executor is not None:
+        _pdf_executor.shutdown(wait=False, cancel_futures=True)
+        _pdf_executor = None
+
 def extract_text_from_docx(file_path: str) -> str:
     """Extract text content from DOCX file."""
     try:
         doc = Document(file_path)
-        text = ""
-        
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
+        parts = [paragraph.text for paragraph in doc.paragraphs]
         
-        return text.strip()
+        return "\n".join(parts).strip()
     except Exception as e:
         raise Exception(f"Failed to extract text from DOCX: {str(e)}")
 
-def extract_text_from_file(file_path: str) -> str:
+# Local state (caches) lives under DATA_DIR, which defaults to data/ next to
+# this file rather than the process working directory
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
+# Extracted text is cached on disk keyed by (content hash, size) so re-parsing
+# or retrying the same document skips PDF/DOCX extraction
+TEXT_CACHE_DIR = os.getenv("TEXT_CACHE_DIR", os.path.join(DATA_DIR, "text_cache"))
+
+_text_cache: Optional[diskcache.Cache] = None
+
+def _get_text_cache() -> diskcache.Cache:
+    """Return the on-disk text cache, opening it on first use."""
+    global _text_cache
+    if _text_cache is None:
+        _text_cache = diskcache.Cache(TEXT_CACHE_DIR)
+    return _text_cache
+
+def extract_text_from_file(file_path: str, content_hash: Optional[str] = None) -> str:
+    """Extract text from various file formats, using the on-disk text cache.
+
+    Pass ``content_hash`` (SHA-256 hex digest of the file) when it is already
+    known to avoid re-reading the file to compute it.
+    """
+    if content_hash is None:
+        with open(file_path, "rb") as file:
+            content_hash = hashlib.file_digest(file, "sha256").hexdigest()
+    
+    text_cache = _get_text_cache()
+    key = (content_hash, os.path.getsize(file_path))
+    text_content = text_cache.get(key)
+    if text_content is None:
+        text_content = _extract_text_uncached(file_path)
+        text_cache.set(key, text_content)
+    return text_content
+
+def purge_text_cache() -> int:
+    """Remove all cached extracted text and return the number of entries removed."""
+    return _get_text_cache().clear()
+
+def _extract_text_uncached(file_path: str) -> str:
     """Extract text from various file formats."""
     file_extension = os.path.splitext(file_path)[1].lower()
     
@@ -56,184 +166,609 @@ def extract_text_from_file(file_path: str) -> str:
     else:
         raise Exception(f"Unsupported file format: {file_extension}")
 
-def parse_routing_guide_with_ai(text_content: str, use_openai: bool = True) -> Dict[str, Any]:
-    """Parse routing guide using OpenAI or Claude API."""
-    prompt = f"""
-    Please analyze the following routing guide document and extract structured information.
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL", "claude-3-sonnet-20240229")
+
+# The instructions and output schema are sent as a fixed system prompt so the
+# provider-side prompt cache can match the prefix across documents. Do not
+# add per-request data (filenames, timestamps) here.
+SYSTEM_PROMPT = """You are an expert in warehouse operations and document analysis. Extract structured information from routing guides and return valid JSON.
+
+Please analyze the routing guide document provided by the user and extract structured information.
+
+Extract the following information and return as JSON:
+1. Document title and version
+2. Packaging rules and requirements
+3. Label placement instructions
+4. Carrier-specific requirements
+5. Special handling instructions
+6. Quality control checkpoints
+7. Documentation requirements
+8. Any other important operational guidelines
+
+Please return the response as a valid JSON object with the following structure:
+{
+    "title": "document title",
+    "version": "version if available",
+    "packaging_rules": [list of packaging rules],
+    "label_placement": [list of label placement instructions],
+    "carrier_requirements": {carrier: [requirements]},
+    "special_handling": [list of special handling instructions],
+    "quality_checkpoints": [list of quality control points],
+    "documentation": [list of documentation requirements],
+    "other_guidelines": [list of other important guidelines]
+}"""
+
+USER_TEMPLATE = "Document content:\n{text}"
+
+_RULE_LIST = {"type": "array", "items": {"type": "string"}}
+
+# Tool schema Claude fills in, so its reply arrives as structured input
+ROUTING_GUIDE_TOOL = {
+    "name": "emit_routing_guide",
+    "description": "Record the structured information extracted from a routing guide.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string"},
+            "version": {"type": "string"},
+            "packaging_rules": _RULE_LIST,
+            "label_placement": _RULE_LIST,
+            "carrier_requirements": {"type": "object", "additionalProperties": _RULE_LIST},
+            "special_handling": _RULE_LIST,
+            "quality_checkpoints": _RULE_LIST,
+            "documentation": _RULE_LIST,
+            "other_guidelines": _RULE_LIST
+        },
+        "required": [
+            "packaging_rules",
+            "label_placement",
+            "carrier_requirements",
+            "special_handling",
+            "quality_checkpoints",
+            "documentation",
+            "other_guidelines"
+        ]
+    }
+}
+
+def build_openai_request(text_content: str) -> Dict[str, Any]:
+    """Build the chat completion request body for OpenAI."""
+    return {
+        "model": OPENAI_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": USER_TEMPLATE.format(text=text_content)}
+        ],
+        "max_tokens": 2000,
+        "temperature": 0,
+        "response_format": {"type": "json_object"}
+    }
+
+def build_anthropic_request(text_content: str) -> Dict[str, Any]:
+    """Build the messages request body for Anthropic."""
+    return {
+        "model": ANTHROPIC_MODEL,
+        "max_tokens": 2000,
+        "temperature": 0,
+        "system": [
+            {"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}
+        ],
+        "tools": [ROUTING_GUIDE_TOOL],
+        "tool_choice": {"type": "tool", "name": ROUTING_GUIDE_TOOL["name"]},
+        "messages": [
+            {"role": "user", "content": USER_TEMPLATE.format(text=text_content)}
+        ]
+    }
+
+def _anthropic_tool_input(message: Any) -> Dict[str, Any]:
+    """Return the structured routing guide from a Claude tool-use reply."""
+    for block in message.content:
+        if block.type == "tool_use":
+            return block.input
+    raise Exception("Claude response did not include routing guide data")
+
+# Long documents are split into overlapping token windows that are parsed
+# in parallel and merged, instead of one oversized prompt
+CHUNK_TOKENS = 3500
+CHUNK_OVERLAP_TOKENS = 200
+
+_encoding: Optional[tiktoken.Encoding] = None
+
+def _get_encoding() -> tiktoken.Encoding:
+    """Return the tokenizer used to size document chunks."""
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.encoding_for_model(OPENAI_MODEL)
+        except KeyError:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+def warm_tokenizer():
+    """Load the tokenizer ahead of the first document.
+
+    The first load reads (and may download) the BPE file; call this from a
+    worker thread at startup so requests never pay for it.
+    """
+    try:
+        _get_encoding()
+    except Exception as e:
+        logger.warning(f"Failed to preload tokenizer: {str(e)}")
+
+def split_by_tokens(text: str, max_tokens: int = CHUNK_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """Split text into windows of at most ``max_tokens`` tokens with overlap."""
+    encoding = _get_encoding()
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return [text]
     
-    Extract the following information and return as JSON:
-    1. Document title and version
-    2. Packaging rules and requirements
-    3. Label placement instructions
-    4. Carrier-specific requirements
-    5. Special handling instructions
-    6. Quality control checkpoints
-    7. Documentation requirements
-    8. Any other important operational guidelines
+    step = max_tokens - overlap
+    return [
+        encoding.decode(tokens[start:start + max_tokens])
+        for start in range(0, len(tokens) - overlap, step)
+    ]
+
+def merge_parsed_chunks(parsed_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge parsed chunk results in order, de-duplicating rules by text.
+
+    Scalar fields (title, version) keep the first non-empty value, list
+    fields are concatenated and dict fields such as ``carrier_requirements``
+    are merged per key.
+    """
+    merged: Dict[str, Any] = {}
+    seen: Dict[Any, set] = {}
+    
+    def _extend(target: List[Any], items: List[Any], seen_key: Any):
+        seen_rules = seen.setdefault(seen_key, set())
+        for item in items:
+            rule_key = str(item).strip().lower()
+            if rule_key not in seen_rules:
+                seen_rules.add(rule_key)
+                target.append(item)
     
-    Document content:
-    {text_content}
+    for parsed_content in parsed_chunks:
+        for key, value in parsed_content.items():
+            if isinstance(value, list):
+                _extend(merged.setdefault(key, []), value, key)
+            elif isinstance(value, dict):
+                section = merged.setdefault(key, {})
+                for sub_key, sub_value in value.items():
+                    if isinstance(sub_value, list):
+                        _extend(section.setdefault(sub_key, []), sub_value, (key, sub_key))
+                    elif not section.get(sub_key):
+                        section[sub_key] = sub_value
+            elif not merged.get(key):
+                merged[key] = value
     
-    Please return the response as a valid JSON object with the following structure:
-    {{
-        "title": "document title",
-        "version": "version if available",
-        "packaging_rules": [list of packaging rules],
-        "label_placement": [list of label placement instructions],
-        "carrier_requirements": {{carrier: [requirements]}},
-        "special_handling": [list of special handling instructions],
-        "quality_checkpoints": [list of quality control points],
-        "documentation": [list of documentation requirements],
-        "other_guidelines": [list of other important guidelines]
-    }}
+    return merged
+
+async def _stream_openai_json(text_content: str) -> Dict[str, Any]:
+    """Stream a JSON-mode completion from OpenAI and parse it.
+
+    The stream is abandoned as soon as the first non-whitespace token shows
+    the reply is not a JSON object, rather than waiting for the full reply.
     """
+    stream = await openai_client.chat.completions.create(
+        **build_openai_request(text_content),
+        stream=True
+    )
     
+    parts = []
+    started = False
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+        
+        if not started:
+            stripped = delta.lstrip()
+            if stripped and stripped[0] != "{":
+                await stream.close()
+                raise Exception("OpenAI response is not a JSON object")
+            started = bool(stripped)
+        parts.append(delta)
+    
+    return orjson.loads("".join(parts))
+
+# Upper bound on in-flight LLM requests across every document and chunk
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "20"))
+_llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+async def _call_llm_limited(text_content: str, use_openai: bool = True) -> Dict[str, Any]:
+    async with _llm_semaphore:
+        return await _call_llm(text_content, use_openai)
+
+async def _call_llm(text_content: str, use_openai: bool = True) -> Dict[str, Any]:
+    """Send one document (or chunk) to OpenAI or Claude and parse the JSON reply.
+
+    If the OpenAI reply is rejected or malformed, Claude is tried instead
+    when it is configured.
+    """
     try:
-        if use_openai and openai.api_key:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an expert in warehouse operations and document analysis. Extract structured information from routing guides and return valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=2000,
-                temperature=0.1
-            )
-            
-            content = response.choices[0].message.content
-            return json.loads(content)
+        if use_openai and openai_client:
+            try:
+                return await _stream_openai_json(text_content)
+            except Exception as e:
+                if not anthropic_client:
+                    raise
+                logger.warning(f"OpenAI parsing failed, falling back to Claude: {str(e)}")
         
-        elif anthropic_client:
-            response = anthropic_client.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=2000,
-                temperature=0,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            content = response.content[0].text
-            return json.loads(content)
+        if anthropic_client:
+            response = await anthropic_client.messages.create(**build_anthropic_request(text_content))
+            return _anthropic_tool_input(response)
         
         else:
             raise Exception("No AI API keys configured")
             
-    except json.JSONDecodeError as e:
-        raise Exception(f"Failed to parse AI response as JSON: {str(e)}")
     except Exception as e:
         raise Exception(f"AI processing failed: {str(e)}")
 
-def extract_packaging_rules(parsed_content: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Extract and structure packaging rules from parsed content."""
-    packaging_rules = []
+# Cached parses are keyed by the models, prompt, output schema and chunking
+# that produced them
+PARSE_CACHE_VERSION = hashlib.sha256(
+    orjson.dumps([OPENAI_MODEL, ANTHROPIC_MODEL, SYSTEM_PROMPT, ROUTING_GUIDE_TOOL, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS])
+).hexdigest()[:16]
+
+async def parse_routing_guide_with_ai(text_content: str, use_openai: bool = True) -> Dict[str, Any]:
+    """Parse routing guide using OpenAI or Claude API."""
+    # Identical documents were already parsed by the same provider; skip the
+    # LLM round-trip
+    provider = "openai" if use_openai and openai_client else "anthropic"
+    cache_version = f"{PARSE_CACHE_VERSION}:{provider}"
+    cached = await ai_cache.get_parsed_content(text_content, cache_version)
+    if cached is not None:
+        return cached
+    
+    # Tokenizing a large document is CPU-bound; keep it off the event loop
+    chunks = await asyncio.to_thread(split_by_tokens, text_content)
+    if len(chunks) == 1:
+        parsed_content = await _call_llm_limited(text_content, use_openai)
+    else:
+        parsed_chunks = await asyncio.gather(*[_call_llm_limited(chunk, use_openai) for chunk in chunks])
+        parsed_content = merge_parsed_chunks(parsed_chunks)
+    
+    await ai_cache.set_parsed_content(text_content, parsed_content, cache_version)
+    return parsed_content
+
+async def parse_routing_guides_batch(texts: List[str], concurrency: int = LLM_MAX_CONCURRENCY) -> List[Any]:
+    """Parse several routing guides concurrently, bounded by a semaphore.
+
+    Results are returned in input order; a failed document yields its
+    exception instead of aborting the whole batch.
+    """
+    sem = asyncio.Semaphore(concurrency)
+
+    async def _parse(text_content: str) -> Dict[str, Any]:
+        async with sem:
+            return await parse_routing_guide_with_ai(text_content)
+
+    tasks = [_parse(text_content) for text_content in texts]
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+class BatchFailedError(Exception):
+    """Raised when a provider batch reaches a terminal failed state."""
+
+# Batch request custom_ids are "<job id>-<chunk index>-<chunk count>" so a
+# job's results can be checked for completeness; Anthropic only accepts
+# [a-zA-Z0-9_-]{1,64}
+BATCH_CUSTOM_ID_SEPARATOR = "-"
+BATCH_CUSTOM_ID_MAX_LENGTH = 64
+
+def _batch_custom_id(job_id: Any, index: int, count: int) -> str:
+    custom_id = BATCH_CUSTOM_ID_SEPARATOR.join((str(job_id), str(index), str(count)))
+    if len(custom_id) > BATCH_CUSTOM_ID_MAX_LENGTH:
+        raise ValueError(f"Batch custom_id {custom_id!r} exceeds {BATCH_CUSTOM_ID_MAX_LENGTH} characters")
+    return custom_id
+
+async def submit_batch(jobs: List[Dict[str, Any]]) -> str:
+    """Submit routing guides to the provider Batch API and return the batch ID.
+
+    Each job is a dict with a ``custom_id`` (the routing guide ID) and the
+    extracted ``text_content``. Batches are processed asynchronously by the
+    provider at reduced cost; use ``retrieve_batch_results`` to collect them.
+    Long documents are submitted as one request per token chunk.
+
+    The returned ID is prefixed with the provider ("openai:..." or
+    "anthropic:...") so results are fetched from the provider that ran the
+    batch even if the configured API keys change in the meantime.
+    """
+    requests = []
+    for job in jobs:
+        chunks = await asyncio.to_thread(split_by_tokens, job["text_content"])
+        for index, chunk in enumerate(chunks):
+            requests.append((_batch_custom_id(job["custom_id"], index, len(chunks)), chunk))
     
-    # Extract from main packaging rules section
-    if "packaging_rules" in parsed_content:
-        for rule in parsed_content["packaging_rules"]:
-            packaging_rules.append({
-                "type": "packaging",
-                "rule": rule,
-                "priority": "standard",
-                "category": "general"
+    if openai_client:
+        lines = [
+            orjson.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": build_openai_request(chunk)
             })
+            for custom_id, chunk in requests
+        ]
+        batch_file = await openai_client.files.create(
+            file=("routing_guides_batch.jsonl", b"\n".join(lines)),
+            purpose="batch"
+        )
+        batch = await openai_client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        return f"openai:{batch.id}"
     
-    # Extract carrier-specific packaging requirements
-    if "carrier_requirements" in parsed_content:
-        for carrier, requirements in parsed_content["carrier_requirements"].items():
-            for req in requirements:
-                if any(keyword in req.lower() for keyword in ["package", "box", "wrap", "protect"]):
-                    packaging_rules.append({
-                        "type": "packaging",
-                        "rule": req,
-                        "priority": "carrier_specific",
-                        "category": carrier,
-                        "carrier": carrier
-                    })
+    elif anthropic_client:
+        batch = await anthropic_client.messages.batches.create(
+            requests=[
+                {"custom_id": custom_id, "params": build_anthropic_request(chunk)}
+                for custom_id, chunk in requests
+            ]
+        )
+        return f"anthropic:{batch.id}"
     
-    # Extract special handling that affects packaging
-    if "special_handling" in parsed_content:
-        for handling in parsed_content["special_handling"]:
-            if any(keyword in handling.lower() for keyword in ["fragile", "hazmat", "temperature", "orientation"]):
-                packaging_rules.append({
-                    "type": "packaging",
-                    "rule": handling,
-                    "priority": "special",
-                    "category": "special_handling"
-                })
+    else:
+        raise Exception("No AI API keys configured")
+
+def _merge_batch_chunks(chunk_results: Dict[str, Any]) -> Dict[str, Any]:
+    """Group per-chunk batch results by job ID and merge them in chunk order.
+
+    A job is only merged when a result came back for every one of its
+    chunks; otherwise it maps to an ``Exception``.
+    """
+    grouped: Dict[str, Dict[int, Any]] = {}
+    counts: Dict[str, int] = {}
+    for custom_id, result in chunk_results.items():
+        job_id, index, count = custom_id.rsplit(BATCH_CUSTOM_ID_SEPARATOR, 2)
+        grouped.setdefault(job_id, {})[int(index)] = result
+        counts[job_id] = int(count)
     
-    return packaging_rules
+    results: Dict[str, Any] = {}
+    for job_id, chunks in grouped.items():
+        missing = set(range(counts[job_id])) - chunks.keys()
+        if missing:
+            results[job_id] = Exception(f"Missing results for chunks {sorted(missing)}")
+            continue
+        ordered = [chunks[index] for index in range(counts[job_id])]
+        failed = next((chunk for chunk in ordered if isinstance(chunk, Exception)), None)
+        results[job_id] = failed if failed is not None else merge_parsed_chunks(ordered)
+    return results
 
-def extract_label_placement_rules(parsed_content: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Extract and structure label placement rules from parsed content."""
-    label_rules = []
+async def retrieve_batch_results(batch_id: str) -> Optional[Dict[str, Any]]:
+    """Check a submitted batch and return its results once it has finished.
+
+    Returns ``None`` while the batch is still running. Otherwise returns a
+    mapping of job ``custom_id`` to either the merged parsed content dict or
+    an ``Exception`` describing why one of its requests failed.
+    """
+    results: Dict[str, Any] = {}
     
-    # Extract from main label placement section
-    if "label_placement" in parsed_content:
-        for rule in parsed_content["label_placement"]:
-            label_rules.append({
-                "type": "label_placement",
-                "rule": rule,
-                "priority": "standard",
-                "category": "general"
-            })
+    provider, separator, provider_batch_id = batch_id.partition(":")
+    if not separator:
+        # Batch IDs stored before they carried a provider prefix
+        provider = "openai" if openai_client else "anthropic"
+        provider_batch_id = batch_id
     
-    # Extract carrier-specific labeling requirements
-    if "carrier_requirements" in parsed_content:
-        for carrier, requirements in parsed_content["carrier_requirements"].items():
-            for req in requirements:
-                if any(keyword in req.lower() for keyword in ["label", "barcode", "address", "tracking"]):
-                    label_rules.append({
-                        "type": "label_placement",
-                        "rule": req,
-                        "priority": "carrier_specific",
-                        "category": carrier,
-                        "carrier": carrier
-                    })
+    if provider not in ("openai", "anthropic"):
+        raise BatchFailedError(f"Batch {batch_id} has unknown provider {provider}")
+    if (openai_client if provider == "openai" else anthropic_client) is None:
+        # Retrying cannot help until the key is restored; fail the batch so
+        # its guides can be resubmitted
+        raise BatchFailedError(f"Batch {batch_id} needs the {provider} API key, which is not configured")
     
-    # Extract documentation requirements that affect labeling
-    if "documentation" in parsed_content:
-        for doc_req in parsed_content["documentation"]:
-            if any(keyword in doc_req.lower() for keyword in ["label", "attach", "affix", "place"]):
-                label_rules.append({
-                    "type": "label_placement",
-                    "rule": doc_req,
-                    "priority": "documentation",
-                    "category": "documentation"
-                })
+    if provider == "openai":
+        batch = await openai_client.batches.retrieve(provider_batch_id)
+        if batch.status in ("validating", "in_progress", "finalizing", "cancelling"):
+            return None
+        
+        if batch.status != "completed":
+            # failed, expired or cancelled; the batch will never produce output
+            raise BatchFailedError(f"Batch {batch_id} ended with status {batch.status}")
+        
+        if batch.output_file_id:
+            output = await openai_client.files.content(batch.output_file_id)
+            for line in output.text.splitlines():
+                if not line.strip():
+                    continue
+                entry = orjson.loads(line)
+                response = entry.get("response") or {}
+                try:
+                    if entry.get("error") or response.get("status_code") != 200:
+                        raise Exception(f"Request failed: {entry.get('error') or response.get('body')}")
+                    content = response["body"]["choices"][0]["message"]["content"]
+                    results[entry["custom_id"]] = orjson.loads(content)
+                except Exception as e:
+                    results[entry["custom_id"]] = e
+        
+        # Requests that failed validation or expired are only reported in the
+        # error file
+        if batch.error_file_id:
+            errors = await openai_client.files.content(batch.error_file_id)
+            for line in errors.text.splitlines():
+                if not line.strip():
+                    continue
+                entry = orjson.loads(line)
+                response = entry.get("response") or {}
+                results[entry["custom_id"]] = Exception(f"Request failed: {entry.get('error') or response.get('body')}")
+        
+        return _merge_batch_chunks(results)
     
-    return label_rules
+    else:
+        batch = await anthropic_client.messages.batches.retrieve(provider_batch_id)
+        if batch.processing_status != "ended":
+            return None
+        
+        async for entry in await anthropic_client.messages.batches.results(provider_batch_id):
+            try:
+                if entry.result.type == "errored":
+                    raise Exception(f"Request errored: {entry.result.error}")
+                if entry.result.type != "succeeded":
+                    # expired or canceled before it was processed
+                    raise Exception(f"Request {entry.result.type}")
+                results[entry.custom_id] = _anthropic_tool_input(entry.result.message)
+            except Exception as e:
+                results[entry.custom_id] = e
+        
+        return _merge_batch_chunks(results)
+
+# Keyword categories used to classify rules. All categories are compiled into
+# one automaton whose values are category bitmasks, so each rule is scanned
+# once no matter how many categories are checked.
+RULE_KEYWORDS = {
+    "packaging": ["package", "box", "wrap", "protect"],
+    "special_handling": ["fragile", "hazmat", "temperature", "orientation"],
+    "label": ["label", "barcode", "address", "tracking"],
+    "documentation": ["label", "attach", "affix", "place"],
+}
+KEYWORD_BITS = {category: 1 << index for index, category in enumerate(RULE_KEYWORDS)}
+
+def _build_keyword_automaton(keywords_by_category: Dict[str, List[str]]) -> ahocorasick.Automaton:
+    """Compile keywords into an Aho-Corasick automaton mapping each to its category bits."""
+    masks: Dict[str, int] = {}
+    for category, keywords in keywords_by_category.items():
+        for keyword in keywords:
+            masks[keyword] = masks.get(keyword, 0) | KEYWORD_BITS[category]
+    
+    automaton = ahocorasick.Automaton()
+    for keyword, mask in masks.items():
+        automaton.add_word(keyword, mask)
+    automaton.make_automaton()
+    return automaton
+
+AHO_KEYWORDS = _build_keyword_automaton(RULE_KEYWORDS)
+
+def _classify_batch(rules: List[str]) -> List[int]:
+    """Return the keyword category bitmask for each rule in a single pass per rule."""
+    masks = []
+    for rule in rules:
+        mask = 0
+        for _, bits in AHO_KEYWORDS.iter(rule.lower()):
+            mask |= bits
+        masks.append(mask)
+    return masks
+
+# Rule extraction schema, in output order for each rule type. Each entry is
+# (section, rule type, priority, category, keyword category). A category of
+# None means the section is keyed by carrier and the carrier name is used.
+RULE_SCHEMA_VERSION = 1
+RULE_SCHEMAS = {
+    1: [
+        ("packaging_rules", "packaging", "standard", "general", None),
+        ("carrier_requirements", "packaging", "carrier_specific", None, "packaging"),
+        ("special_handling", "packaging", "special", "special_handling", "special_handling"),
+        ("label_placement", "label_placement", "standard", "general", None),
+        ("carrier_requirements", "label_placement", "carrier_specific", None, "label"),
+        ("documentation", "label_placement", "documentation", "documentation", "documentation"),
+    ]
+}
+
+_extractor_cache: Dict[int, Callable[[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]] = {}
+
+def _generate_extractor_source(schema: List[tuple]) -> str:
+    """Generate straight-line Python source for a rule extraction schema."""
+    rule_types = list(dict.fromkeys(rule_type for _, rule_type, _, _, _ in schema))
+    lines = ["def _extract(pc):"]
+    
+    for index, rule_type in enumerate(rule_types):
+        lines.append(f"    out{index} = []")
+        lines.append(f"    append{index} = out{index}.append")
+    
+    # Classify each keyword-filtered section once, however many rule types read it
+    filtered_sections = list(dict.fromkeys(
+        (section, category is None) for section, _, _, category, keywords in schema if keywords
+    ))
+    for section, by_carrier in filtered_sections:
+        if by_carrier:
+            lines.append(f"    pairs = [(carrier, r) for carrier, reqs in (pc.get({section!r}) or {{}}).items() for r in reqs]")
+            lines.append(f"    classified_{section} = [(carrier, r, mask) for (carrier, r), mask in zip(pairs, _classify_batch([r for _, r in pairs]))]")
+        else:
+            lines.append(f"    rules = pc.get({section!r}) or ()")
+            lines.append(f"    classified_{section} = list(zip(rules, _classify_batch(rules)))")
+    
+    for section, rule_type, priority, category, keywords in schema:
+        append = f"append{rule_types.index(rule_type)}"
+        if keywords is None:
+            lines.append(f"    for r in pc.get({section!r}) or ():")
+            lines.append(f"        {append}({{'type': {rule_type!r}, 'rule': r, 'priority': {priority!r}, 'category': {category!r}}})")
+        elif category is None:
+            lines.append(f"    for carrier, r, mask in classified_{section}:")
+            lines.append(f"        if mask & {KEYWORD_BITS[keywords]}:")
+            lines.append(f"            {append}({{'type': {rule_type!r}, 'rule': r, 'priority': {priority!r}, 'category': carrier, 'carrier': carrier}})")
+        else:
+            lines.append(f"    for r, mask in classified_{section}:")
+            lines.append(f"        if mask & {KEYWORD_BITS[keywords]}:")
+            lines.append(f"            {append}({{'type': {rule_type!r}, 'rule': r, 'priority': {priority!r}, 'category': {category!r}}})")
+    
+    returned = ", ".join(f"{rule_type!r}: out{index}" for index, rule_type in enumerate(rule_types))
+    lines.append(f"    return {{{returned}}}")
+    return "\n".join(lines)
 
-def process_document_upload(file_path: str, original_filename: str) -> Dict[str, Any]:
+def build_extractor(schema_version: int = RULE_SCHEMA_VERSION) -> Callable[[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]:
+    """Compile (and cache) a rule extractor specialized for a schema version.
+
+    The returned function takes parsed routing guide content and returns the
+    extracted rules grouped by rule type.
+    """
+    extractor = _extractor_cache.get(schema_version)
+    if extractor is None:
+        source = _generate_extractor_source(RULE_SCHEMAS[schema_version])
+        namespace = {"_classify_batch": _classify_batch}
+        exec(compile(source, f"<rule_extractor_v{schema_version}>", "exec"), namespace)
+        extractor = _extractor_cache[schema_version] = namespace["_extract"]
+    return extractor
+
+_extract_rules = build_extractor(RULE_SCHEMA_VERSION)
+
+def extract_packaging_rules(parsed_content: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Extract and structure packaging rules from parsed content."""
+    return _extract_rules(parsed_content)["packaging"]
+
+def extract_label_placement_rules(parsed_content: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Extract and structure label placement rules from parsed content."""
+    return _extract_rules(parsed_content)["label_placement"]
+
+def build_ai_extracted_rules(parsed_content: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the ``ai_extracted_rules`` payload stored on a routing guide."""
+    extracted = _extract_rules(parsed_content)
+    packaging_rules = extracted["packaging"]
+    label_placement_rules = extracted["label_placement"]
+    
+    return {
+        "packaging": packaging_rules,
+        "label_placement": label_placement_rules,
+        "total_count": len(packaging_rules) + len(label_placement_rules)
+    }
+
+async def process_document_upload(file_path: str, original_filename: str, content_hash: Optional[str] = None) -> Dict[str, Any]:
     """Process uploaded document and extract all relevant information."""
     try:
         # Extract text from file
-        text_content = extract_text_from_file(file_path)
+        text_content = await asyncio.to_thread(extract_text_from_file, file_path, content_hash)
         
         if not text_content.strip():
             raise Exception("No text content found in the document")
         
         # Parse with AI
-        parsed_content = parse_routing_guide_with_ai(text_content)
+        parsed_content = await parse_routing_guide_with_ai(text_content)
         
         # Extract specific rule types
-        packaging_rules = extract_packaging_rules(parsed_content)
-        label_placement_rules = extract_label_placement_rules(parsed_content)
+        ai_extracted_rules = build_ai_extracted_rules(parsed_content)
+        packaging_rules = ai_extracted_rules["packaging"]
+        label_placement_rules = ai_extracted_rules["label_placement"]
         
         # Combine all extracted information
         result = {
             "original_filename": original_filename,
-            "text_content": text_content,
             "parsed_content": parsed_content,
             "packaging_rules": packaging_rules,
             "label_placement_rules": label_placement_rules,
-            "total_rules_extracted": len(packaging_rules) + len(label_placement_rules),
+            "total_rules_extracted": ai_extracted_rules["total_count"],
             "processing_status": "success",
-            "ai_extracted_rules": {
-                "packaging": packaging_rules,
-                "label_placement": label_placement_rules,
-                "total_count": len(packaging_rules) + len(label_placement_rules)
-            }
+            "ai_extracted_rules": ai_extracted_rules
         }
         
         return result
@@ -0,0 +1,77 @@
+"""add routing guide content hash, batch id and lookup indexes
+
+Revision ID: 3f9c2a7d1b4e
+Revises:
+Create Date: 2026-10-15 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a7d1b4e'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Databases created from scratch by Base.metadata.create_all already have
+# these objects, so each one is only added when it is missing
+def _columns(inspector, table):
+    return {column["name"] for column in inspector.get_columns(table)}
+
+
+def _indexes(inspector, table):
+    return {index["name"]: index for index in inspector.get_indexes(table)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+
+    columns = _columns(inspector, "routing_guides")
+    if "content_hash" not in columns:
+        op.add_column("routing_guides", sa.Column("content_hash", sa.String(length=64), nullable=True))
+    if "batch_id" not in columns:
+        op.add_column("routing_guides", sa.Column("batch_id", sa.String(), nullable=True))
+
+    indexes = _indexes(inspector, "routing_guides")
+    # Earlier builds declared content_hash unique; duplicate uploads now get
+    # their own rows
+    content_hash_index = indexes.get("ix_routing_guides_content_hash")
+    if content_hash_index and content_hash_index["unique"]:
+        op.drop_index("ix_routing_guides_content_hash", table_name="routing_guides")
+        content_hash_index = None
+    if content_hash_index is None:
+        op.create_index("ix_routing_guides_content_hash", "routing_guides", ["content_hash"])
+    if "ix_routing_guides_batch_id" not in indexes:
+        op.create_index("ix_routing_guides_batch_id", "routing_guides", ["batch_id"])
+    if "ix_routing_guides_created_by" not in indexes:
+        op.create_index("ix_routing_guides_created_by", "routing_guides", ["created_by"])
+    if "ix_routing_guides_status_created_at" not in indexes:
+        op.create_index(
+            "ix_routing_guides_status_created_at",
+            "routing_guides",
+            ["status", sa.text("created_at DESC")]
+        )
+
+    if "ix_orders_status_priority_cutoff_time" not in _indexes(inspector, "orders"):
+        op.create_index(
+            "ix_orders_status_priority_cutoff_time",
+            "orders",
+            ["status", "priority", "cutoff_time"]
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_orders_status_priority_cutoff_time", table_name="orders")
+    op.drop_index("ix_routing_guides_status_created_at", table_name="routing_guides")
+    op.drop_index("ix_routing_guides_created_by", table_name="routing_guides")
+    op.drop_index("ix_routing_guides_batch_id", table_name="routing_guides")
+    op.drop_index("ix_routing_guides_content_hash", table_name="routing_guides")
+    op.drop_column("routing_guides", "batch_id")
+    op.drop_column("routing_guides", "content_hash")
@@ -1,6 +1,7 @@
 import os
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, NamedTuple
+from cachetools import TTLCache
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
@@ -12,8 +13,9 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing - new hashes use argon2; existing bcrypt hashes still
+# verify and are upgraded on the next successful login
+pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
 
 # JWT settings
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-here")
@@ -31,6 +33,44 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple:
+    """Verify a password and return (is_valid, new_hash_or_None) if it needs rehashing."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+class LoginUser(NamedTuple):
+    """Snapshot of the user columns needed to authenticate a login."""
+    id: int
+    username: str
+    hashed_password: str
+    is_active: bool
+
+# Short-lived cache of login lookups; holds plain snapshots, never ORM objects
+_login_user_cache = TTLCache(maxsize=10_000, ttl=30)
+
+def get_cached_login_user(username: str) -> Optional[LoginUser]:
+    """Return the cached login snapshot for a username, if present."""
+    return _login_user_cache.get(username)
+
+def load_login_user(db: Session, username: str) -> Optional[LoginUser]:
+    """Load a user's login snapshot from the database."""
+    user = db.query(User).filter(User.username == username).first()
+    if user is None:
+        return None
+    return LoginUser(user.id, user.username, user.hashed_password, user.is_active)
+
+def store_password_hash(db: Session, user_id: int, hashed_password: str):
+    """Replace a user's stored password hash and commit."""
+    db.query(User).filter(User.id == user_id).update({User.hashed_password: hashed_password})
+    db.commit()
+
+def cache_login_user(login_user: LoginUser):
+    """Store a login snapshot in the cache."""
+    _login_user_cache[login_user.username] = login_user
+
+def invalidate_cached_user(username: str):
+    """Drop a cached login snapshot, e.g. after a password change."""
+    _login_user_cache.pop(username, None)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token."""
     to_encode = data.copy()
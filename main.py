@@ -1,15 +1,25 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 import os
+import asyncio
 from dotenv import load_dotenv
 from database import engine, Base
 from routers import auth, routing_guides, websocket
+from ai_processor import shutdown_pdf_executor, close_http_client, warm_tokenizer
 
 # Load environment variables
 load_dotenv()
 
-# Create database tables
+# Use uvloop when available (installed with uvicorn[standard], not on Windows)
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    uvloop = None
+
+# Create database tables. create_all never alters existing tables; columns
+# and indexes added later are applied with `alembic upgrade head`
 Base.metadata.create_all(bind=engine)
 
 # Initialize FastAPI app
@@ -18,7 +28,8 @@ app = FastAPI(
     description="A comprehensive warehouse compliance and routing guide management system with AI processing capabilities",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS middleware to allow external host requests
@@ -60,6 +71,19 @@ async def root():
         "health": "/health"
     }
 
+# Pick up provider batches that were still running when the server stopped,
+# and load the tokenizer before the first upload needs it
+@app.on_event("startup")
+async def startup_event():
+    await routing_guides.resume_batch_polling()
+    await asyncio.to_thread(warm_tokenizer)
+
+# Release worker processes and pooled connections used for AI processing
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_pdf_executor()
+    await close_http_client()
+
 # Include routers
 app.include_router(auth.router, prefix="/api")
 app.include_router(routing_guides.router, prefix="/api")
@@ -94,5 +118,10 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=True,
-        log_level="info"
+        log_level="info",
+        loop="uvloop" if uvloop else "asyncio",
+        http="httptools",
+        ws="websockets",
+        # Broadcasts are compressed once in the connection manager instead
+        ws_per_message_deflate=False
     )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime, Enum, Time
+from sqlalchemy import Column, Integer, String, JSON, DateTime, Enum, Time, Index
 from sqlalchemy.sql import func
 from database import Base
 import enum
@@ -32,3 +32,7 @@ class Order(Base):
     cutoff_time = Column(Time)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_orders_status_priority_cutoff_time", status, priority, cutoff_time),
+    )
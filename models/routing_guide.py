@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -19,12 +19,18 @@ class RoutingGuide(Base):
     description = Column(Text)
     file_path = Column(String, nullable=False)
     original_filename = Column(String, nullable=False)
+    content_hash = Column(String(64), index=True)
     parsed_content = Column(JSON)
     ai_extracted_rules = Column(JSON)
     status = Column(Enum(RoutingGuideStatus), nullable=False, default=RoutingGuideStatus.uploading)
-    created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    batch_id = Column(String, index=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        Index("ix_routing_guides_status_created_at", status, created_at.desc()),
+    )
+
     # Relationships
     creator = relationship("User", back_populates="routing_guides")
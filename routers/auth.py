@@ -1,26 +1,55 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from sqlalchemy.orm import Session
+from sqlalchemy import or_
 from datetime import timedelta
+import asyncio
 from database import get_db
 from models.user import User
 from schemas.auth import LoginRequest, TokenResponse, UserProfile
 from schemas.user import UserCreate, UserResponse
-from auth import create_access_token, verify_password, hash_password, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
+from auth import (
+    create_access_token,
+    verify_and_update_password,
+    hash_password,
+    get_current_user,
+    get_cached_login_user,
+    load_login_user,
+    store_password_hash,
+    cache_login_user,
+    invalidate_cached_user,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+)
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 @router.post("/login", response_model=TokenResponse)
 async def login(login_request: LoginRequest, db: Session = Depends(get_db)):
     """Authenticate user and return access token."""
-    user = db.query(User).filter(User.username == login_request.username).first()
+    user = get_cached_login_user(login_request.username)
+    if user is None:
+        user = await asyncio.to_thread(load_login_user, db, login_request.username)
+        if user is not None:
+            cache_login_user(user)
     
-    if not user or not verify_password(login_request.password, user.hashed_password):
+    # Password hashing is CPU-bound; keep it off the event loop
+    is_valid, new_hash = (False, None)
+    if user:
+        is_valid, new_hash = await asyncio.to_thread(
+            verify_and_update_password, login_request.password, user.hashed_password
+        )
+    
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Upgrade legacy bcrypt hashes to argon2
+    if new_hash:
+        await asyncio.to_thread(store_password_hash, db, user.id, new_hash)
+        invalidate_cached_user(user.username)
+    
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -41,24 +70,25 @@ async def login(login_request: LoginRequest, db: Session = Depends(get_db)):
 @router.post("/register", response_model=UserResponse)
 async def register(user_create: UserCreate, db: Session = Depends(get_db)):
     """Register a new user."""
-    # Check if username already exists
-    existing_user = db.query(User).filter(User.username == user_create.username).first()
-    if existing_user:
+    # Check if username or email already exists in a single query
+    existing_users = db.query(User.username, User.email).filter(
+        or_(User.username == user_create.username, User.email == user_create.email)
+    ).all()
+    
+    if any(existing.username == user_create.username for existing in existing_users):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
         )
     
-    # Check if email already exists
-    existing_email = db.query(User).filter(User.email == user_create.email).first()
-    if existing_email:
+    if existing_users:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
     # Create new user
-    hashed_password = hash_password(user_create.password)
+    hashed_password = await asyncio.to_thread(hash_password, user_create.password)
     db_user = User(
         username=user_create.username,
         email=user_create.email,
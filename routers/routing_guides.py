@@ -1,17 +1,47 @@
 from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import update, delete
+from typing import List, Optional, Dict, Any
 import os
-import shutil
+import aiofiles
+import asyncio
+import hashlib
+import pathlib
+import secrets
+import logging
 from datetime import datetime
-from database import get_db
+from database import get_db, SessionLocal
 from models.routing_guide import RoutingGuide, RoutingGuideStatus
 from models.user import User
 from auth import get_current_user
+from ai_processor import (
+    process_document_upload,
+    extract_text_from_file,
+    purge_text_cache,
+    submit_batch,
+    retrieve_batch_results,
+    build_ai_extracted_rules,
+    BatchFailedError,
+)
 from pydantic import BaseModel
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/routing-guides", tags=["routing guides"])
 
+# Upload files are streamed to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Seconds between provider batch status checks
+BATCH_POLL_INTERVAL_SECONDS = 60
+
+# Upper bound for the poll delay while status checks keep failing
+BATCH_POLL_MAX_BACKOFF_SECONDS = 900
+
+# Keep references to polling tasks so they are not garbage collected
+_batch_poll_tasks = set()
+
 # Pydantic schemas
 class RoutingGuideBase(BaseModel):
     title: str
@@ -25,6 +55,13 @@ class RoutingGuideUpdate(BaseModel):
     description: Optional[str] = None
     status: Optional[RoutingGuideStatus] = None
 
+class BatchProcessRequest(BaseModel):
+    routing_guide_ids: Optional[List[int]] = None
+
+class BatchProcessResponse(BaseModel):
+    batch_id: str
+    routing_guide_ids: List[int]
+
 class RoutingGuideResponse(RoutingGuideBase):
     id: int
     file_path: str
@@ -37,6 +74,28 @@ class RoutingGuideResponse(RoutingGuideBase):
     class Config:
         from_attributes = True
 
+class RoutingGuideDetail(RoutingGuideResponse):
+    parsed_content: Optional[Dict[str, Any]] = None
+    ai_extracted_rules: Optional[Dict[str, Any]] = None
+
+class RoutingGuideSummary(BaseModel):
+    id: int
+    title: str
+    original_filename: str
+    status: RoutingGuideStatus
+    created_by: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+def _remove_upload(file_path: str):
+    """Delete an uploaded file that is not referenced by any routing guide."""
+    try:
+        os.remove(file_path)
+    except OSError as e:
+        logger.warning(f"Failed to delete file {file_path}: {str(e)}")
+
 @router.post("/upload", response_model=RoutingGuideResponse)
 async def upload_routing_guide(
     title: str = Form(...),
@@ -60,20 +119,34 @@ async def upload_routing_guide(
     upload_dir = os.getenv("UPLOAD_DIR", "uploads")
     os.makedirs(upload_dir, exist_ok=True)
     
-    # Generate unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    safe_filename = f"{timestamp}_{file.filename}"
+    # Generate unique filename; keep only the base name to prevent path traversal
+    safe_filename = f"{secrets.token_hex(8)}_{pathlib.Path(file.filename).name}"
     file_path = os.path.join(upload_dir, safe_filename)
     
-    # Save file
+    # Save file, hashing its content in the same pass
+    digest = hashlib.sha256()
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        async with aiofiles.open(file_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                await buffer.write(chunk)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to save file: {str(e)}"
         )
+    content_hash = digest.hexdigest()
+    
+    # The same document was already parsed successfully; the parse depends
+    # only on the file content, so the new record can reuse it
+    parsed_guide = await asyncio.to_thread(
+        db.query(RoutingGuide.parsed_content, RoutingGuide.ai_extracted_rules)
+        .filter(
+            RoutingGuide.content_hash == content_hash,
+            RoutingGuide.status == RoutingGuideStatus.active
+        )
+        .first
+    )
     
     # Create database record
     db_routing_guide = RoutingGuide(
@@ -81,17 +154,199 @@ async def upload_routing_guide(
         description=description,
         file_path=file_path,
         original_filename=file.filename,
+        content_hash=content_hash,
         status=RoutingGuideStatus.uploading,
         created_by=current_user.id
     )
     
+    if parsed_guide:
+        db_routing_guide.parsed_content = parsed_guide.parsed_content
+        db_routing_guide.ai_extracted_rules = parsed_guide.ai_extracted_rules
+        db_routing_guide.status = RoutingGuideStatus.active
+    
+    # The session is synchronous, so run database round-trips in a worker thread
     db.add(db_routing_guide)
-    db.commit()
-    db.refresh(db_routing_guide)
+    await asyncio.to_thread(db.commit)
+    
+    if parsed_guide:
+        await asyncio.to_thread(db.refresh, db_routing_guide)
+        return db_routing_guide
+    
+    # Extract text and parse rules with AI without blocking the event loop
+    db_routing_guide.status = RoutingGuideStatus.processing
+    await asyncio.to_thread(db.commit)
+    
+    processing_result = await process_document_upload(file_path, file.filename, content_hash)
+    
+    if processing_result["processing_status"] == "success":
+        db_routing_guide.parsed_content = processing_result["parsed_content"]
+        db_routing_guide.status = RoutingGuideStatus.active
+    else:
+        db_routing_guide.status = RoutingGuideStatus.error
+    db_routing_guide.ai_extracted_rules = processing_result["ai_extracted_rules"]
+    
+    await asyncio.to_thread(db.commit)
+    await asyncio.to_thread(db.refresh, db_routing_guide)
     
     return db_routing_guide
 
-@router.get("/", response_model=List[RoutingGuideResponse])
+def _store_batch_results(batch_id: str, results: Dict[str, Any]):
+    """Write a finished batch's results to its routing guides."""
+    db = SessionLocal()
+    try:
+        routing_guides = db.query(RoutingGuide).filter(RoutingGuide.batch_id == batch_id).all()
+        for routing_guide in routing_guides:
+            parsed_content = results.get(str(routing_guide.id))
+            if isinstance(parsed_content, dict):
+                routing_guide.parsed_content = parsed_content
+                routing_guide.ai_extracted_rules = build_ai_extracted_rules(parsed_content)
+                routing_guide.status = RoutingGuideStatus.active
+            else:
+                routing_guide.status = RoutingGuideStatus.error
+            routing_guide.batch_id = None
+        db.commit()
+    finally:
+        db.close()
+
+async def _poll_batch_results(batch_id: str):
+    """Poll a provider batch until it finishes and store the parsed results.
+
+    Transient errors while checking the batch are retried with exponential
+    backoff; guides are only marked as failed once the batch itself reaches
+    a terminal failed state.
+    """
+    delay = BATCH_POLL_INTERVAL_SECONDS
+    while True:
+        await asyncio.sleep(delay)
+        
+        try:
+            results = await retrieve_batch_results(batch_id)
+        except BatchFailedError as e:
+            logger.error(f"Batch {batch_id} failed: {str(e)}")
+            results = {}
+        except Exception as e:
+            delay = min(delay * 2, BATCH_POLL_MAX_BACKOFF_SECONDS)
+            logger.warning(f"Checking batch {batch_id} failed, retrying in {delay}s: {str(e)}")
+            continue
+        
+        if results is None:
+            delay = BATCH_POLL_INTERVAL_SECONDS
+            continue
+        
+        await asyncio.to_thread(_store_batch_results, batch_id, results)
+        
+        logger.info(f"Batch {batch_id} completed with {len(results)} results")
+        return
+
+def _schedule_batch_poll(batch_id: str):
+    task = asyncio.create_task(_poll_batch_results(batch_id))
+    _batch_poll_tasks.add(task)
+    task.add_done_callback(_batch_poll_tasks.discard)
+
+def _pending_batch_ids() -> List[str]:
+    db = SessionLocal()
+    try:
+        return [
+            batch_id for (batch_id,) in db.query(RoutingGuide.batch_id)
+            .filter(
+                RoutingGuide.batch_id.isnot(None),
+                RoutingGuide.status == RoutingGuideStatus.processing
+            )
+            .distinct()
+        ]
+    finally:
+        db.close()
+
+async def resume_batch_polling():
+    """Restart polling for batches submitted before the last restart."""
+    batch_ids = await asyncio.to_thread(_pending_batch_ids)
+    for batch_id in batch_ids:
+        _schedule_batch_poll(batch_id)
+    
+    if batch_ids:
+        logger.info(f"Resumed polling for {len(batch_ids)} pending batches")
+
+@router.post("/batch-process", response_model=BatchProcessResponse)
+async def batch_process_routing_guides(
+    batch_request: BatchProcessRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Queue routing guides for AI parsing through the provider Batch API (admin only)."""
+    if current_user.role.value != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can batch process routing guides"
+        )
+    
+    query = db.query(RoutingGuide).filter(RoutingGuide.batch_id.is_(None))
+    if batch_request.routing_guide_ids:
+        query = query.filter(RoutingGuide.id.in_(batch_request.routing_guide_ids))
+    else:
+        query = query.filter(RoutingGuide.status.in_([RoutingGuideStatus.uploading, RoutingGuideStatus.error]))
+    
+    # The session is synchronous, so run database round-trips in a worker thread
+    routing_guides = await asyncio.to_thread(query.all)
+    if not routing_guides:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No routing guides to process"
+        )
+    
+    jobs = []
+    for routing_guide in routing_guides:
+        try:
+            text_content = await asyncio.to_thread(
+                extract_text_from_file, routing_guide.file_path, routing_guide.content_hash
+            )
+        except Exception as e:
+            logger.error(f"Failed to extract text for routing guide {routing_guide.id}: {str(e)}")
+            routing_guide.status = RoutingGuideStatus.error
+            continue
+        jobs.append({"custom_id": routing_guide.id, "text_content": text_content})
+    
+    if not jobs:
+        await asyncio.to_thread(db.commit)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No text could be extracted from the selected routing guides"
+        )
+    
+    try:
+        batch_id = await submit_batch(jobs)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Failed to submit batch: {str(e)}"
+        )
+    
+    job_ids = [job["custom_id"] for job in jobs]
+    for routing_guide in routing_guides:
+        if routing_guide.id in job_ids:
+            routing_guide.batch_id = batch_id
+            routing_guide.status = RoutingGuideStatus.processing
+    await asyncio.to_thread(db.commit)
+    
+    _schedule_batch_poll(batch_id)
+    
+    return BatchProcessResponse(batch_id=batch_id, routing_guide_ids=job_ids)
+
+@router.delete("/cache")
+async def purge_extracted_text_cache(
+    current_user: User = Depends(get_current_user)
+):
+    """Purge the on-disk cache of extracted document text (admin only)."""
+    if current_user.role.value != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can purge the text cache"
+        )
+    
+    removed = await asyncio.to_thread(purge_text_cache)
+    
+    return {"message": f"Purged {removed} cached documents"}
+
+@router.get("/", response_model=List[RoutingGuideSummary])
 async def get_routing_guides(
     skip: int = 0,
     limit: int = 100,
@@ -100,15 +355,26 @@ async def get_routing_guides(
     db: Session = Depends(get_db)
 ):
     """Get all routing guides with optional filtering."""
-    query = db.query(RoutingGuide)
+    # Load only the summary columns; full details are served by the detail endpoint
+    query = db.query(
+        RoutingGuide.id,
+        RoutingGuide.title,
+        RoutingGuide.original_filename,
+        RoutingGuide.status,
+        RoutingGuide.created_by,
+        RoutingGuide.created_at,
+    )
     
     if status:
         query = query.filter(RoutingGuide.status == status)
     
     routing_guides = query.offset(skip).limit(limit).all()
-    return routing_guides
+    
+    # Rows already match RoutingGuideSummary; serialize them directly with
+    # orjson instead of validating each one through the response model
+    return ORJSONResponse([row._asdict() for row in routing_guides])
 
-@router.get("/{routing_guide_id}", response_model=RoutingGuideResponse)
+@router.get("/{routing_guide_id}", response_model=RoutingGuideDetail)
 async def get_routing_guide(
     routing_guide_id: int,
     current_user: User = Depends(get_current_user),
@@ -125,6 +391,24 @@ async def get_routing_guide(
     
     return routing_guide
 
+def _owner_or_admin(current_user: User) -> list:
+    """SQL conditions limiting a statement to guides the user may modify."""
+    if current_user.role.value == "admin":
+        return []
+    return [RoutingGuide.created_by == current_user.id]
+
+def _raise_not_found_or_forbidden(db: Session, routing_guide_id: int, action: str):
+    """Explain why a permission-scoped statement matched no routing guide."""
+    if db.query(RoutingGuide.id).filter(RoutingGuide.id == routing_guide_id).first():
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Not enough permissions to {action} this routing guide"
+        )
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Routing guide not found"
+    )
+
 @router.put("/{routing_guide_id}", response_model=RoutingGuideResponse)
 async def update_routing_guide(
     routing_guide_id: int,
@@ -133,32 +417,27 @@ async def update_routing_guide(
     db: Session = Depends(get_db)
 ):
     """Update a routing guide."""
-    routing_guide = db.query(RoutingGuide).filter(RoutingGuide.id == routing_guide_id).first()
-    
-    if not routing_guide:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Routing guide not found"
-        )
-    
-    # Check permissions - only creator or admin can update
-    if routing_guide.created_by != current_user.id and current_user.role.value != "admin":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions to update this routing guide"
-        )
-    
-    # Update fields
     update_data = routing_guide_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(routing_guide, field, value)
+    update_data["updated_at"] = datetime.utcnow()
+    
+    # Only creator or admin can update; the check is part of the UPDATE itself
+    stmt = (
+        update(RoutingGuide)
+        .where(RoutingGuide.id == routing_guide_id, *_owner_or_admin(current_user))
+        .values(**update_data)
+        .returning(RoutingGuide)
+    )
+    routing_guide = db.execute(stmt).scalar_one_or_none()
     
-    routing_guide.updated_at = datetime.utcnow()
+    if routing_guide is None:
+        db.rollback()
+        _raise_not_found_or_forbidden(db, routing_guide_id, "update")
     
+    # Serialize before commit so the expired instance is not reloaded
+    response = RoutingGuideResponse.model_validate(routing_guide)
     db.commit()
-    db.refresh(routing_guide)
     
-    return routing_guide
+    return response
 
 @router.delete("/{routing_guide_id}")
 async def delete_routing_guide(
@@ -167,31 +446,22 @@ async def delete_routing_guide(
     db: Session = Depends(get_db)
 ):
     """Delete a routing guide."""
-    routing_guide = db.query(RoutingGuide).filter(RoutingGuide.id == routing_guide_id).first()
-    
-    if not routing_guide:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Routing guide not found"
-        )
-    
-    # Check permissions - only creator or admin can delete
-    if routing_guide.created_by != current_user.id and current_user.role.value != "admin":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions to delete this routing guide"
-        )
+    # Only creator or admin can delete; the check is part of the DELETE itself
+    stmt = (
+        delete(RoutingGuide)
+        .where(RoutingGuide.id == routing_guide_id, *_owner_or_admin(current_user))
+        .returning(RoutingGuide.file_path)
+    )
+    file_path = db.execute(stmt).scalar_one_or_none()
     
-    # Delete file from filesystem
-    try:
-        if os.path.exists(routing_guide.file_path):
-            os.remove(routing_guide.file_path)
-    except Exception as e:
-        # Log error but don't fail the deletion
-        print(f"Warning: Failed to delete file {routing_guide.file_path}: {str(e)}")
+    if file_path is None:
+        db.rollback()
+        _raise_not_found_or_forbidden(db, routing_guide_id, "delete")
     
-    # Delete from database
-    db.delete(routing_guide)
     db.commit()
     
+    # Delete file from filesystem; log errors but don't fail the deletion
+    if os.path.exists(file_path):
+        _remove_upload(file_path)
+    
     return {"message": "Routing guide deleted successfully"}
@@ -1,23 +1,117 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, status, Query
-from typing import Optional, Dict, Any
-import json
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, status, Query, Response
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
+from dataclasses import dataclass
+from cachetools import TTLCache
+import asyncio
+import hashlib
+import orjson
+import ormsgpack
 import logging
+import time
+import contextlib
+from fastapi.security import HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from database import get_db
-from models.user import User
-from auth import verify_token
-from websocket_manager import connection_manager, MessageType, AlertLevel
-from datetime import datetime
+from database import get_db, SessionLocal
+from models.user import User, UserRole
+from auth import verify_token, security, ALGORITHM
+from websocket_manager import connection_manager, encode_message, now_iso, DataMessage, MessageType, AlertLevel
+# Aliased because the notify endpoints below share these names
+from websocket_manager import (
+    notify_task_completion as _notify_task_completion,
+    notify_order_assigned as _notify_order_assigned,
+    notify_compliance_issue as _notify_compliance_issue,
+    notify_system_status as _notify_system_status,
+    broadcast_maintenance_notice as _broadcast_maintenance_notice,
+)
+from pydantic import BaseModel
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/ws", tags=["websocket"])
 
-async def get_current_user_websocket(token: str, db: Session):
-    """Get current user from WebSocket token parameter"""
+# Permission bits carried on the principal
+PERM_ADMIN = 1
+PERM_SUPERVISOR = 2
+PERM_WORKER = 4
+
+_ROLE_PERMS = {
+    "admin": PERM_ADMIN,
+    "supervisor": PERM_SUPERVISOR,
+    "worker": PERM_WORKER,
+}
+
+# Roles allowed to broadcast, alert and inspect connections
+_BROADCASTERS = frozenset({"supervisor", "admin"})
+# Roles allowed to push task and order updates
+_UPDATERS = frozenset({"supervisor", "admin", "worker"})
+
+@dataclass(frozen=True)
+class UserPrincipal:
+    """Authenticated user identity, detached from any database session"""
+    id: int
+    username: str
+    email: str
+    role: UserRole
+    is_active: bool
+    role_str: str
+    perms: int
+
+# HMAC signatures are cheap enough to check inline; asymmetric ones
+# (RS256, ES256, PS256...) are verified in a worker thread
+_VERIFY_INLINE = ALGORITHM.startswith("HS")
+
+# Per-connection message rate limit: a bucket of RATE_LIMIT_BURST tokens
+# refilled at RATE_LIMIT_PER_SECOND; each message type costs some tokens
+RATE_LIMIT_BURST = 50.0
+RATE_LIMIT_PER_SECOND = 20.0
+
+# Charged for every inbound frame before it is decoded, so malformed frames
+# are rate limited too; counts towards the message type's cost
+FRAME_COST = 1
+
+class TokenBucket:
+    """Token bucket rate limiter for one WebSocket connection"""
+    __slots__ = ("tokens", "last_refill")
+
+    def __init__(self):
+        self.tokens = RATE_LIMIT_BURST
+        self.last_refill = time.monotonic()
+
+    def consume(self, cost: float) -> bool:
+        now = time.monotonic()
+        self.tokens = min(RATE_LIMIT_BURST, self.tokens + (now - self.last_refill) * RATE_LIMIT_PER_SECOND)
+        self.last_refill = now
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+# Recently verified tokens -> (principal, token expiry), so repeat requests
+# skip signature verification and the user lookup
+_auth_cache = TTLCache(maxsize=10000, ttl=30)
+
+def _token_cache_key(token: str) -> str:
+    return hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
+async def get_current_user_websocket(token: str, db: Session) -> UserPrincipal:
+    """Get current user from WebSocket token parameter
+
+    Used directly for the WebSocket handshake; REST endpoints go through
+    get_current_user_rest.
+    """
+    cache_key = _token_cache_key(token)
+    cached = _auth_cache.get(cache_key)
+    if cached is not None:
+        principal, expires_at = cached
+        if expires_at > time.time():
+            return principal
+    
     try:
-        payload = verify_token(token)
+        if _VERIFY_INLINE:
+            payload = verify_token(token)
+        else:
+            payload = await asyncio.to_thread(verify_token, token)
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(status_code=401, detail="Invalid token")
@@ -29,59 +123,109 @@ async def get_current_user_websocket(token: str, db: Session):
         if not user.is_active:
             raise HTTPException(status_code=401, detail="Inactive user")
         
-        return user
+        principal = UserPrincipal(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            role=user.role,
+            is_active=user.is_active,
+            role_str=user.role.value,
+            perms=_ROLE_PERMS.get(user.role.value, 0)
+        )
+        _auth_cache[cache_key] = (principal, payload.get("exp", float("inf")))
+        return principal
     except Exception as e:
         logger.error(f"WebSocket authentication error: {str(e)}")
         raise HTTPException(status_code=401, detail="Authentication failed")
 
+async def get_current_user_rest(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> UserPrincipal:
+    """Get current user for REST endpoints from the bearer token
+
+    The session only checks out a pooled connection on a cache miss.
+    """
+    return await get_current_user_websocket(credentials.credentials, db)
+
 @router.websocket("/connect")
 async def websocket_endpoint(
     websocket: WebSocket,
     token: str = Query(...),
-    db: Session = Depends(get_db)
+    compression: Optional[str] = Query(None),
+    encoding: Optional[str] = Query(None),
+    batch: bool = Query(False)
 ):
-    """Main WebSocket endpoint for real-time communication"""
+    """Main WebSocket endpoint for real-time communication
+
+    Clients that pass compression=deflate receive large messages as
+    zlib-compressed binary frames instead of text frames. Clients that
+    pass encoding=msgpack send and receive MessagePack binary frames.
+    Clients that pass batch=true may receive several queued messages in one
+    {"type": "batch", "items": [...]} frame.
+    """
     user = None
     try:
-        # Authenticate user
-        user = await get_current_user_websocket(token, db)
+        # Authenticate user, returning the DB connection to the pool before
+        # entering the long-lived receive loop
+        with contextlib.closing(SessionLocal()) as db:
+            user = await get_current_user_websocket(token, db)
         
         # Connect user to WebSocket manager
         await connection_manager.connect(
             websocket=websocket,
             user_id=user.id,
-            user_role=user.role.value,
+            user_role=user.role_str,
             user_data={
                 "username": user.username,
                 "email": user.email,
-                "connected_at": datetime.utcnow().isoformat()
-            }
+                "connected_at": now_iso()
+            },
+            compression=compression,
+            encoding=encoding,
+            batching=batch
         )
         
         # Main message handling loop
+        bucket = TokenBucket()
+        decode_binary = ormsgpack.unpackb if encoding == "msgpack" else orjson.loads
         while True:
             try:
-                # Receive message from client
-                data = await websocket.receive_text()
-                message = json.loads(data)
+                # Receive message from client; binary frames are parsed
+                # straight from bytes without decoding to str first
+                event = await websocket.receive()
+                if event["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(event.get("code", 1000))
+                connection_manager.touch(websocket)
+                
+                # Over the rate limit: drop the frame without decoding or
+                # replying to it
+                if not bucket.consume(FRAME_COST):
+                    continue
+                
+                data = event.get("bytes")
+                if data is not None:
+                    message = decode_binary(data)
+                else:
+                    message = orjson.loads(event.get("text"))
                 
                 # Handle different message types
-                await handle_client_message(websocket, user, message)
+                await handle_client_message(websocket, user, message, bucket)
                 
             except WebSocketDisconnect:
                 break
-            except json.JSONDecodeError:
+            except (orjson.JSONDecodeError, ormsgpack.MsgpackDecodeError):
                 await connection_manager.send_personal_message({
                     "type": "error",
-                    "message": "Invalid JSON format",
-                    "timestamp": datetime.utcnow().isoformat()
+                    "message": "Invalid message format",
+                    "timestamp": now_iso()
                 }, websocket)
             except Exception as e:
                 logger.error(f"WebSocket message handling error: {str(e)}")
                 await connection_manager.send_personal_message({
                     "type": "error",
                     "message": "Message processing error",
-                    "timestamp": datetime.utcnow().isoformat()
+                    "timestamp": now_iso()
                 }, websocket)
                 
     except HTTPException:
@@ -95,85 +239,162 @@ async def websocket_endpoint(
         if user:
             await connection_manager.disconnect(websocket)
 
-async def handle_client_message(websocket: WebSocket, user: User, message: Dict[str, Any]):
-    """Handle messages received from WebSocket clients"""
-    message_type = message.get("type")
-    
-    if message_type == "ping":
-        await connection_manager.handle_heartbeat(websocket)
-    
-    elif message_type == "subscribe":
-        # Subscribe to specific channels/rooms
-        channel = message.get("channel")
-        if channel:
-            await connection_manager.join_room(websocket, channel)
-            await connection_manager.send_personal_message({
-                "type": "subscription_confirmed",
-                "channel": channel,
-                "timestamp": datetime.utcnow().isoformat()
-            }, websocket)
-    
-    elif message_type == "unsubscribe":
-        # Unsubscribe from channels/rooms
-        channel = message.get("channel")
-        if channel:
-            await connection_manager.leave_room(websocket, channel)
-            await connection_manager.send_personal_message({
-                "type": "unsubscription_confirmed",
-                "channel": channel,
-                "timestamp": datetime.utcnow().isoformat()
-            }, websocket)
-    
-    elif message_type == "task_status_update":
-        # Handle task status updates from workers
-        if user.role.value == "worker":
-            task_data = message.get("data", {})
-            task_data["worker_id"] = user.id
-            task_data["updated_by"] = user.username
-            await connection_manager.send_task_update(task_data)
-    
-    elif message_type == "request_status":
-        # Send current connection status
-        status_info = connection_manager.get_connected_users()
+async def _on_ping(websocket: WebSocket, user: UserPrincipal, message: Dict[str, Any]):
+    await connection_manager.handle_heartbeat(websocket)
+
+async def _on_subscribe(websocket: WebSocket, user: UserPrincipal, message: Dict[str, Any]):
+    # Subscribe to specific channels/rooms
+    channel = message.get("channel")
+    if channel:
+        await connection_manager.join_room(websocket, channel)
         await connection_manager.send_personal_message({
-            "type": "status_response",  
-            "data": status_info,
-            "timestamp": datetime.utcnow().isoformat()
+            "type": "subscription_confirmed",
+            "channel": channel,
+            "timestamp": now_iso()
         }, websocket)
+
+async def _on_unsubscribe(websocket: WebSocket, user: UserPrincipal, message: Dict[str, Any]):
+    # Unsubscribe from channels/rooms
+    channel = message.get("channel")
+    if channel:
+        await connection_manager.leave_room(websocket, channel)
+        await connection_manager.send_personal_message({
+            "type": "unsubscription_confirmed",
+            "channel": channel,
+            "timestamp": now_iso()
+        }, websocket)
+
+async def _on_task_status_update(websocket: WebSocket, user: UserPrincipal, message: Dict[str, Any]):
+    # Handle task status updates from workers
+    if user.perms & PERM_WORKER:
+        task_data = message.get("data", {})
+        task_data["worker_id"] = user.id
+        task_data["updated_by"] = user.username
+        await connection_manager.send_task_update(task_data)
+
+async def _on_request_status(websocket: WebSocket, user: UserPrincipal, message: Dict[str, Any]):
+    # Send current connection status
+    status_info = connection_manager.get_connected_users()
+    await connection_manager.send_personal_message({
+        "type": "status_response",  
+        "data": status_info,
+        "timestamp": now_iso()
+    }, websocket)
+
+async def _on_broadcast_message(websocket: WebSocket, user: UserPrincipal, message: Dict[str, Any]):
+    # Allow supervisors and admins to broadcast messages
+    if user.role_str in _BROADCASTERS:
+        broadcast_data = message.get("data", {})
+        target_roles = message.get("target_roles", ["worker"])
+        
+        # The decoded message is ours to mutate; client fields still win
+        broadcast_data.setdefault("message", "")
+        broadcast_data.setdefault("from_user", user.username)
+        broadcast_data.setdefault("from_role", user.role_str)
+        
+        await connection_manager.broadcast_to_roles(
+            DataMessage(MessageType.NOTIFICATION, broadcast_data, now_iso()),
+            target_roles
+        )
+
+# Client message handlers and their rate limit cost, by message type
+_HANDLERS: Dict[str, Tuple[Callable[[WebSocket, UserPrincipal, Dict[str, Any]], Awaitable[None]], float]] = {
+    "ping": (_on_ping, 1),
+    "subscribe": (_on_subscribe, 1),
+    "unsubscribe": (_on_unsubscribe, 1),
+    "task_status_update": (_on_task_status_update, 1),
+    "request_status": (_on_request_status, 2),
+    "broadcast_message": (_on_broadcast_message, 5),
+}
+
+async def handle_client_message(websocket: WebSocket, user: UserPrincipal, message: Dict[str, Any], bucket: Optional[TokenBucket] = None):
+    """Handle messages received from WebSocket clients
+
+    Messages over the connection's rate limit are dropped. The receive
+    loop has already charged FRAME_COST for the frame; only the rest of the
+    message type's cost is taken here.
+    """
+    message_type = message.get("type")
+    entry = _HANDLERS.get(message_type) if isinstance(message_type, str) else None
+    
+    extra_cost = entry[1] - FRAME_COST if entry else 0
+    if bucket is not None and extra_cost > 0 and not bucket.consume(extra_cost):
+        return
     
-    elif message_type == "broadcast_message":
-        # Allow supervisors and admins to broadcast messages
-        if user.role.value in ["supervisor", "admin"]:
-            broadcast_data = message.get("data", {})
-            target_roles = message.get("target_roles", ["worker"])
-            
-            await connection_manager.broadcast_to_roles({
-                "type": MessageType.NOTIFICATION,
-                "data": {
-                    "message": broadcast_data.get("message", ""),
-                    "from_user": user.username,
-                    "from_role": user.role.value,
-                    **broadcast_data
-                },
-                "timestamp": datetime.utcnow().isoformat()
-            }, target_roles)
-    
-    else:
+    if entry is None:
         await connection_manager.send_personal_message({
             "type": "error",
             "message": f"Unknown message type: {message_type}",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": now_iso()
         }, websocket)
+        return
+    
+    await entry[0](websocket, user, message)
+
+# Request bodies for REST endpoints. Known fields are validated; anything
+# else the client sends is kept and forwarded with the message.
+
+class EventPayload(BaseModel):
+    class Config:
+        extra = "allow"
+
+    def to_message_data(self) -> Dict[str, Any]:
+        """Fields the client actually sent, without filled-in defaults"""
+        return self.model_dump(exclude_unset=True)
+
+class BroadcastBody(EventPayload):
+    message: str = ""
+
+class AlertBody(EventPayload):
+    message: str = ""
+    title: Optional[str] = None
+
+class TaskUpdateBody(EventPayload):
+    task_id: Optional[int] = None
+    order_id: Optional[int] = None
+    worker_id: Optional[int] = None
+    status: Optional[str] = None
+
+class OrderStatusBody(EventPayload):
+    order_id: Optional[int] = None
+    assigned_worker_id: Optional[int] = None
+    status: Optional[str] = None
+
+class NotificationBody(EventPayload):
+    message: str = ""
+    title: Optional[str] = None
+
+# Pre-encoded bodies for the fixed acknowledgement replies
+_ACK_BROADCAST = orjson.dumps({"message": "Broadcast sent successfully"})
+_ACK_ALERT = orjson.dumps({"message": "Alert sent successfully"})
+_ACK_TASK_UPDATE = orjson.dumps({"message": "Task update sent successfully"})
+_ACK_ORDER_STATUS_UPDATE = orjson.dumps({"message": "Order status update sent successfully"})
+_ACK_SUPERVISOR_ALERT = orjson.dumps({"message": "Supervisor alert sent successfully"})
+_ACK_NOTIFICATION = orjson.dumps({"message": "Notification sent successfully"})
+_ACK_CLEANUP = orjson.dumps({"message": "Inactive connections cleaned up successfully"})
+_ACK_TASK_COMPLETION_NOTIFICATION = orjson.dumps({"message": "Task completion notification sent"})
+_ACK_ORDER_ASSIGNMENT_NOTIFICATION = orjson.dumps({"message": "Order assignment notification sent"})
+_ACK_COMPLIANCE_ISSUE_NOTIFICATION = orjson.dumps({"message": "Compliance issue notification sent"})
+_ACK_SYSTEM_STATUS_NOTIFICATION = orjson.dumps({"message": "System status notification sent"})
+_ACK_MAINTENANCE_NOTICE = orjson.dumps({"message": "Maintenance notice broadcasted"})
+
+def _ack(body: bytes) -> Response:
+    """JSON reply with a pre-encoded body
+
+    A new Response is built each time because middleware (CORS) adds
+    headers to the response it is given.
+    """
+    return Response(content=body, media_type="application/json")
 
 # REST endpoints for WebSocket management
 
 @router.get("/connections")
 async def get_connections(
     role: Optional[str] = None,
-    current_user: User = Depends(get_current_user_websocket)
+    current_user: UserPrincipal = Depends(get_current_user_rest)
 ):
     """Get information about current WebSocket connections"""
-    if current_user.role.value not in ["supervisor", "admin"]:
+    if current_user.role_str not in _BROADCASTERS:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
@@ -183,156 +404,140 @@ async def get_connections(
 
 @router.post("/broadcast")
 async def broadcast_message(
-    message_data: Dict[str, Any],
-    target_roles: Optional[list] = None,
-    current_user: User = Depends(get_current_user_websocket)
+    message_data: BroadcastBody,
+    target_roles: Optional[List[str]] = None,
+    current_user: UserPrincipal = Depends(get_current_user_rest)
 ):
     """Broadcast message to specific roles or all users"""
-    if current_user.role.value not in ["supervisor", "admin"]:
+    if current_user.role_str not in _BROADCASTERS:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions to broadcast messages"
         )
     
-    broadcast_message = {
-        "type": MessageType.NOTIFICATION,
-        "data": {
-            **message_data,
-            "from_user": current_user.username,
-            "from_role": current_user.role.value,
-        },
-        "timestamp": datetime.utcnow().isoformat()
-    }
+    # Add sender information
+    data = message_data.to_message_data()
+    data["from_user"] = current_user.username
+    data["from_role"] = current_user.role_str
+    
+    broadcast_message = DataMessage(MessageType.NOTIFICATION, data, now_iso())
     
-    if target_roles:
-        await connection_manager.broadcast_to_roles(broadcast_message, target_roles)
-    else:
-        await connection_manager.broadcast_to_all(broadcast_message)
+    await connection_manager.broadcast_preencoded(encode_message(broadcast_message), target_roles)
     
-    return {"message": "Broadcast sent successfully"}
+    return _ack(_ACK_BROADCAST)
 
 @router.post("/alert")
 async def send_alert(
-    alert_data: Dict[str, Any],
+    alert_data: AlertBody,
     level: AlertLevel = AlertLevel.INFO,
-    target_roles: Optional[list] = None,
-    current_user: User = Depends(get_current_user_websocket)
+    target_roles: Optional[List[str]] = None,
+    current_user: UserPrincipal = Depends(get_current_user_rest)
 ):
     """Send alert to specified roles"""
-    if current_user.role.value not in ["supervisor", "admin"]:
+    if current_user.role_str not in _BROADCASTERS:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions to send alerts"
         )
     
     # Add sender information to alert
-    alert_data_with_sender = {
-        **alert_data,
-        "sent_by": current_user.username,
-        "sent_by_role": current_user.role.value,
-    }
+    data = alert_data.to_message_data()
+    data["sent_by"] = current_user.username
+    data["sent_by_role"] = current_user.role_str
     
-    await connection_manager.send_alert(alert_data_with_sender, level, target_roles)
+    await connection_manager.send_alert(data, level, target_roles)
     
-    return {"message": "Alert sent successfully"}
+    return _ack(_ACK_ALERT)
 
 @router.post("/task-update")
 async def send_task_update(
-    task_data: Dict[str, Any],
-    current_user: User = Depends(get_current_user_websocket)
+    task_data: TaskUpdateBody,
+    current_user: UserPrincipal = Depends(get_current_user_rest)
 ):
     """Send task update notification"""
-    if current_user.role.value not in ["supervisor", "admin", "worker"]:
+    if current_user.role_str not in _UPDATERS:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
     # Add sender information
-    task_data_with_sender = {
-        **task_data,
-        "updated_by": current_user.username,
-        "updated_by_role": current_user.role.value,
-    }
+    data = task_data.to_message_data()
+    data["updated_by"] = current_user.username
+    data["updated_by_role"] = current_user.role_str
     
-    await connection_manager.send_task_update(task_data_with_sender)
+    await connection_manager.send_task_update(data)
     
-    return {"message": "Task update sent successfully"}
+    return _ack(_ACK_TASK_UPDATE)
 
 @router.post("/order-status")
 async def send_order_status_update(
-    order_data: Dict[str, Any],
-    current_user: User = Depends(get_current_user_websocket)
+    order_data: OrderStatusBody,
+    current_user: UserPrincipal = Depends(get_current_user_rest)
 ):
     """Send order status update notification"""
-    if current_user.role.value not in ["supervisor", "admin", "worker"]:
+    if current_user.role_str not in _UPDATERS:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
     # Add sender information
-    order_data_with_sender = {
-        **order_data,
-        "updated_by": current_user.username,
-        "updated_by_role": current_user.role.value,
-    }
+    data = order_data.to_message_data()
+    data["updated_by"] = current_user.username
+    data["updated_by_role"] = current_user.role_str
     
-    await connection_manager.send_order_status_update(order_data_with_sender)
+    await connection_manager.send_order_status_update(data)
     
-    return {"message": "Order status update sent successfully"}
+    return _ack(_ACK_ORDER_STATUS_UPDATE)
 
 @router.post("/supervisor-alert")
 async def send_supervisor_alert(
-    alert_data: Dict[str, Any],
+    alert_data: AlertBody,
     level: AlertLevel = AlertLevel.WARNING,
-    current_user: User = Depends(get_current_user_websocket)
+    current_user: UserPrincipal = Depends(get_current_user_rest)
 ):
     """Send alert specifically to supervisors and admins"""
     # Add sender information
-    alert_data_with_sender = {
-        **alert_data,
-        "reported_by": current_user.username,
-        "reported_by_role": current_user.role.value,
-    }
+    data = alert_data.to_message_data()
+    data["reported_by"] = current_user.username
+    data["reported_by_role"] = current_user.role_str
     
-    await connection_manager.send_supervisor_alert(alert_data_with_sender, level)
+    await connection_manager.send_supervisor_alert(data, level)
     
-    return {"message": "Supervisor alert sent successfully"}
+    return _ack(_ACK_SUPERVISOR_ALERT)
 
 @router.post("/notification")
 async def send_notification(
-    notification_data: Dict[str, Any],
+    notification_data: NotificationBody,
     user_id: Optional[int] = None,
     user_role: Optional[str] = None,
-    target_roles: Optional[list] = None,
-    current_user: User = Depends(get_current_user_websocket)
+    target_roles: Optional[List[str]] = None,
+    current_user: UserPrincipal = Depends(get_current_user_rest)
 ):
     """Send notification to specific user or roles"""
     # Add sender information
-    notification_data_with_sender = {
-        **notification_data,
-        "from_user": current_user.username,
-        "from_role": current_user.role.value,
-    }
+    data = notification_data.to_message_data()
+    data["from_user"] = current_user.username
+    data["from_role"] = current_user.role_str
     
     await connection_manager.send_notification(
-        notification_data_with_sender,
+        data,
         user_id,
         user_role,
         target_roles
     )
     
-    return {"message": "Notification sent successfully"}
+    return _ack(_ACK_NOTIFICATION)
 
 @router.delete("/disconnect/{user_id}")
 async def disconnect_user(
     user_id: int,
     user_role: str,
-    current_user: User = Depends(get_current_user_websocket)
+    current_user: UserPrincipal = Depends(get_current_user_rest)
 ):
     """Disconnect a specific user (admin only)"""
-    if current_user.role.value != "admin":
+    if not current_user.perms & PERM_ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only admins can disconnect users"
@@ -345,10 +550,10 @@ async def disconnect_user(
 @router.post("/cleanup")
 async def cleanup_inactive_connections(
     timeout_minutes: int = 30,
-    current_user: User = Depends(get_current_user_websocket)
+    current_user: UserPrincipal = Depends(get_current_user_rest)
 ):
     """Clean up inactive connections (admin only)"""
-    if current_user.role.value != "admin":
+    if not current_user.perms & PERM_ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only admins can cleanup connections"
@@ -356,7 +561,7 @@ async def cleanup_inactive_connections(
     
     await connection_manager.cleanup_inactive_connections(timeout_minutes)
     
-    return {"message": "Inactive connections cleaned up successfully"}
+    return _ack(_ACK_CLEANUP)
 
 # Utility endpoints for specific warehouse operations
 
@@ -365,76 +570,66 @@ async def notify_task_completion(
     task_id: int,
     order_id: int,
     worker_id: int,
-    completion_data: Dict[str, Any],
-    current_user: User = Depends(get_current_user_websocket)
+    completion_data: EventPayload,
+    current_user: UserPrincipal = Depends(get_current_user_rest)
 ):
     """Notify users of task completion"""
-    from websocket_manager import notify_task_completion
+    await _notify_task_completion(task_id, order_id, worker_id, completion_data.to_message_data())
     
-    await notify_task_completion(task_id, order_id, worker_id, completion_data)
-    
-    return {"message": "Task completion notification sent"}
+    return _ack(_ACK_TASK_COMPLETION_NOTIFICATION)
 
 @router.post("/notify/order-assigned")
 async def notify_order_assigned(
     order_id: int,
     worker_id: int,
-    order_data: Dict[str, Any],
-    current_user: User = Depends(get_current_user_websocket)
+    order_data: EventPayload,
+    current_user: UserPrincipal = Depends(get_current_user_rest)
 ):
     """Notify users when order is assigned"""
-    from websocket_manager import notify_order_assigned
-    
-    await notify_order_assigned(order_id, worker_id, order_data)
+    await _notify_order_assigned(order_id, worker_id, order_data.to_message_data())
     
-    return {"message": "Order assignment notification sent"}
+    return _ack(_ACK_ORDER_ASSIGNMENT_NOTIFICATION)
 
 @router.post("/notify/compliance-issue")
 async def notify_compliance_issue(
-    issue_data: Dict[str, Any],
-    current_user: User = Depends(get_current_user_websocket)
+    issue_data: EventPayload,
+    current_user: UserPrincipal = Depends(get_current_user_rest)
 ):
     """Notify supervisors of compliance issues"""
-    from websocket_manager import notify_compliance_issue
+    await _notify_compliance_issue(issue_data.to_message_data())
     
-    await notify_compliance_issue(issue_data)
-    
-    return {"message": "Compliance issue notification sent"}
+    return _ack(_ACK_COMPLIANCE_ISSUE_NOTIFICATION)
 
 @router.post("/notify/system-status")
 async def notify_system_status(
-    status_data: Dict[str, Any],
+    status_data: EventPayload,
     level: AlertLevel = AlertLevel.INFO,
-    current_user: User = Depends(get_current_user_websocket)
+    current_user: UserPrincipal = Depends(get_current_user_rest)
 ):
     """Send system status updates"""
-    if current_user.role.value not in ["supervisor", "admin"]:
+    if current_user.role_str not in _BROADCASTERS:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
-    from websocket_manager import notify_system_status
-    
-    await notify_system_status(status_data, level)
+    await _notify_system_status(status_data.to_message_data(), level)
     
-    return {"message": "System status notification sent"}
+    return _ack(_ACK_SYSTEM_STATUS_NOTIFICATION)
 
 @router.post("/notify/maintenance")
 async def broadcast_maintenance_notice(
     notice: str,
     scheduled_time: Optional[str] = None,
-    current_user: User = Depends(get_current_user_websocket)
+    current_user: UserPrincipal = Depends(get_current_user_rest)
 ):
     """Broadcast maintenance notices"""
-    if current_user.role.value != "admin":
+    if not current_user.perms & PERM_ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only admins can send maintenance notices"
         )
     
-    from websocket_manager import broadcast_maintenance_notice
-    
-    await broadcast_maintenance_notice(notice, scheduled_time)
+    await _broadcast_maintenance_notice(notice, scheduled_time)
     
-    return {"message": "Maintenance notice broadcasted"}
+    return _ack(_ACK_MAINTENANCE_NOTICE)
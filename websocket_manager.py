@@ -1,9 +1,16 @@
 import asyncio
-import json
+import itertools
+import time
+import zlib
+import orjson
+import ormsgpack
 import logging
-from typing import Dict, Set, Optional, Any, List
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Set, Optional, Any, List, Tuple, Union
+from dataclasses import dataclass
 from datetime import datetime
-from fastapi import WebSocket, WebSocketDisconnect
+from fastapi import WebSocket
 from enum import Enum
 
 # Configure logging
@@ -24,6 +31,85 @@ class AlertLevel(str, Enum):
     ERROR = "error"
     CRITICAL = "critical"
 
+@dataclass(slots=True)
+class DataMessage:
+    """Outbound message carrying a data payload (task, order, notification)"""
+    type: MessageType
+    data: Dict[str, Any]
+    timestamp: str
+
+@dataclass(slots=True)
+class AlertMessage:
+    """Outbound alert message"""
+    type: MessageType
+    level: AlertLevel
+    data: Dict[str, Any]
+    timestamp: str
+
+# Shared stand-in for a role with no connections
+_NO_CONNECTIONS = MappingProxyType({})
+
+# Roles that make up each broadcast group
+ROLE_GROUPS = {
+    "staff": frozenset({"supervisor", "admin"}),
+}
+
+# Maximum number of outbound messages buffered per connection
+OUTBOUND_QUEUE_SIZE = 256
+
+# For connections that opt in with ?batch=true, messages already waiting in
+# the queue are sent together as one {"type": "batch", "items": [...]} frame,
+# up to this many at a time
+MAX_BATCH_MESSAGES = 64
+
+# Connections that opt in with ?compression=deflate receive payloads above
+# this size as zlib-compressed binary frames; smaller ones stay plain text
+COMPRESSION_MIN_BYTES = 1024
+COMPRESSION_LEVEL = 6
+
+# Bursts of task and order updates are held this long and sent as one frame
+UPDATE_COALESCE_SECONDS = 0.010
+
+_ts_second = None
+_ts_value = ""
+
+def now_iso() -> str:
+    """Current UTC timestamp in ISO format, reformatted at most once per second"""
+    global _ts_second, _ts_value
+    second = int(time.time())
+    if second != _ts_second:
+        _ts_second = second
+        _ts_value = datetime.utcfromtimestamp(second).isoformat()
+    return _ts_value
+
+# Anything encode_message accepts
+Message = Union[Dict[str, Any], DataMessage, AlertMessage]
+
+def encode_message(message: Message) -> str:
+    """Serialize a message into a WebSocket text frame payload"""
+    return orjson.dumps(message).decode()
+
+def batch_frame(payloads: List[str]) -> str:
+    """Join encoded messages into one frame; a single message is sent as is"""
+    if len(payloads) == 1:
+        return payloads[0]
+    return '{"type":"batch","items":[' + ",".join(payloads) + "]}"
+
+@lru_cache(maxsize=128)
+def compress_payload(payload: str) -> Optional[bytes]:
+    """Compress a payload for deflate connections, or None if it is too small
+
+    Recent results are cached so repeated identical notifications are not
+    compressed again.
+    """
+    data = payload.encode()
+    if len(data) < COMPRESSION_MIN_BYTES:
+        return None
+    return zlib.compress(data, COMPRESSION_LEVEL)
+
+# Heartbeat reply, encoded once
+PONG_FRAME = encode_message({"type": "pong"})
+
 class ConnectionManager:
     """Manages WebSocket connections for different user types and rooms"""
     
@@ -35,22 +121,69 @@ class ConnectionManager:
             "worker": {}
         }
         
+        # Index of connections by user ID alone, for lookups without a role
+        self.by_user_id: Dict[int, WebSocket] = {}
+        
+        # Connections in each role group, maintained on connect/disconnect
+        self._role_groups: Dict[str, Set[WebSocket]] = {group: set() for group in ROLE_GROUPS}
+        
         # Store connections by room/channel for targeted messaging
         self.rooms: Dict[str, Set[WebSocket]] = {}
         
+        # Rooms each connection has joined, so disconnect only visits those
+        self.ws_rooms: Dict[WebSocket, Set[str]] = {}
+        
         # Store user metadata for each connection
         self.connection_metadata: Dict[WebSocket, Dict[str, Any]] = {}
         
+        # Each connection gets a small integer handle; per-connection values
+        # touched on hot paths live in flat maps keyed by it
+        self._conn_id_counter = itertools.count(1)
+        self.conn_ids: Dict[WebSocket, int] = {}
+        self.ws_by_id: Dict[int, WebSocket] = {}
+        self.last_activity_by_conn: Dict[int, float] = {}
+        
+        # Outbound message queue and writer task per connection, so sending
+        # never blocks the caller on a slow client's socket
+        self.out_queues: Dict[WebSocket, asyncio.Queue] = {}
+        self.writer_tasks: Dict[WebSocket, asyncio.Task] = {}
+        
+        # Connections that accept pre-compressed binary frames
+        self.deflate_connections: Set[WebSocket] = set()
+        
+        # Connections that opted into MessagePack binary frames
+        self.msgpack_connections: Set[WebSocket] = set()
+        
+        # Connections that accept several queued messages in one batch frame
+        self.batching_connections: Set[WebSocket] = set()
+        
+        # Keep references to slow-client disconnect tasks until they finish
+        self._drop_tasks: Set[asyncio.Task] = set()
+        
+        # Task/order updates waiting for the next flush, keyed by
+        # (batch type, role group, None) or (batch type, role, user ID)
+        self.pending_updates: Dict[Tuple[str, str, Optional[int]], List[Dict[str, Any]]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        
+        # Per-role statistics keys and default room names, built once
+        self._active_keys = {role: f"active_{role}s" for role in self.active_connections}
+        self._role_rooms = {role: f"role_{role}" for role in self.active_connections}
+        
+        # Summary returned by get_connected_users(); rebuilt only after a
+        # connect or disconnect changes it
+        self._summary_cache: Optional[Dict[str, Any]] = None
+        
         # Track connection statistics
         self.connection_stats = {
             "total_connections": 0,
             "active_workers": 0,
             "active_supervisors": 0,
             "active_admins": 0,
-            "last_activity": datetime.utcnow()
+            # Wall-clock epoch seconds, formatted in get_connected_users
+            "last_activity": time.time()
         }
 
-    async def connect(self, websocket: WebSocket, user_id: int, user_role: str, user_data: Dict[str, Any] = None):
+    async def connect(self, websocket: WebSocket, user_id: int, user_role: str, user_data: Dict[str, Any] = None, compression: Optional[str] = None, encoding: Optional[str] = None, batching: bool = False):
         """Accept a new WebSocket connection and register the user"""
         try:
             await websocket.accept()
@@ -64,41 +197,65 @@ class ConnectionManager:
                 await self.disconnect_user(user_id, user_role)
             
             self.active_connections[user_role][user_id] = websocket
+            self.by_user_id[user_id] = websocket
+            for group, roles in ROLE_GROUPS.items():
+                if user_role in roles:
+                    self._role_groups[group].add(websocket)
+            
+            if compression == "deflate":
+                self.deflate_connections.add(websocket)
+            if encoding == "msgpack":
+                self.msgpack_connections.add(websocket)
+            if batching:
+                self.batching_connections.add(websocket)
+            
+            # Start the writer for this connection
+            self.out_queues[websocket] = asyncio.Queue(maxsize=OUTBOUND_QUEUE_SIZE)
+            self.writer_tasks[websocket] = asyncio.create_task(self._writer(websocket))
             
             # Store connection metadata
+            conn_id = next(self._conn_id_counter)
+            self.conn_ids[websocket] = conn_id
+            self.ws_by_id[conn_id] = websocket
+            self.last_activity_by_conn[conn_id] = time.monotonic()
             self.connection_metadata[websocket] = {
+                "conn_id": conn_id,
                 "user_id": user_id,
                 "user_role": user_role,
-                "connected_at": datetime.utcnow(),
-                "last_activity": datetime.utcnow(),
+                "connected_at": time.time(),
                 "user_data": user_data or {}
             }
             
             # Update statistics
             self.connection_stats["total_connections"] += 1
-            self.connection_stats[f"active_{user_role}s"] += 1
-            self.connection_stats["last_activity"] = datetime.utcnow()
+            self._summary_cache = None
+            self.connection_stats[self._active_keys.get(user_role) or f"active_{user_role}s"] += 1
+            self.connection_stats["last_activity"] = time.time()
             
             # Add to default room based on role
-            await self.join_room(websocket, f"role_{user_role}")
+            await self.join_room(websocket, self._role_rooms.get(user_role) or f"role_{user_role}")
             
             # Send welcome message
             await self.send_personal_message({
                 "type": MessageType.SYSTEM_MESSAGE,
                 "message": "Connected to warehouse management system",
-                "timestamp": datetime.utcnow().isoformat(),
-                "user_role": user_role
+                "timestamp": now_iso(),
+                "user_role": user_role,
+                "compression": "deflate" if websocket in self.deflate_connections else None,
+                "encoding": "msgpack" if websocket in self.msgpack_connections else "json",
+                "batching": batching
             }, websocket)
             
-            # Notify supervisors and admins of new worker connection
+            # Notify supervisors and admins of new worker connection;
+            # coalesced so a reconnect storm yields one frame per window
             if user_role == "worker":
-                await self.broadcast_to_roles({
+                self._queue_update({
                     "type": MessageType.WORKER_STATUS,
                     "action": "connected",
                     "worker_id": user_id,
                     "worker_data": user_data,
-                    "timestamp": datetime.utcnow().isoformat()
-                }, ["supervisor", "admin"])
+                    "timestamp": now_iso()
+                }, "worker_status_batch", [("staff", None)])
             
             logger.info(f"User {user_id} ({user_role}) connected via WebSocket")
             
@@ -119,27 +276,51 @@ class ConnectionManager:
             # Remove from active connections
             if user_role in self.active_connections and user_id in self.active_connections[user_role]:
                 del self.active_connections[user_role][user_id]
+            if self.by_user_id.get(user_id) is websocket:
+                del self.by_user_id[user_id]
             
-            # Remove from all rooms
-            for room_connections in self.rooms.values():
-                room_connections.discard(websocket)
+            for group_connections in self._role_groups.values():
+                group_connections.discard(websocket)
+            
+            # Remove from the rooms this connection joined
+            for room_name in self.ws_rooms.pop(websocket, ()):
+                room_connections = self.rooms.get(room_name)
+                if room_connections is not None:
+                    room_connections.discard(websocket)
+                    if not room_connections:
+                        del self.rooms[room_name]
             
             # Remove metadata
             del self.connection_metadata[websocket]
+            conn_id = self.conn_ids.pop(websocket, None)
+            self.ws_by_id.pop(conn_id, None)
+            self.last_activity_by_conn.pop(conn_id, None)
+            
+            # Stop the writer; it may be the caller if its send failed
+            self.out_queues.pop(websocket, None)
+            self.deflate_connections.discard(websocket)
+            self.msgpack_connections.discard(websocket)
+            self.batching_connections.discard(websocket)
+            writer_task = self.writer_tasks.pop(websocket, None)
+            if writer_task is not None and writer_task is not asyncio.current_task():
+                writer_task.cancel()
             
             # Update statistics
             self.connection_stats["total_connections"] -= 1
-            if f"active_{user_role}s" in self.connection_stats:
-                self.connection_stats[f"active_{user_role}s"] -= 1
+            self._summary_cache = None
+            active_key = self._active_keys.get(user_role) or f"active_{user_role}s"
+            if active_key in self.connection_stats:
+                self.connection_stats[active_key] -= 1
             
-            # Notify supervisors and admins of worker disconnection
+            # Notify supervisors and admins of worker disconnection;
+            # coalesced so a mass disconnect yields one frame per window
             if user_role == "worker":
-                await self.broadcast_to_roles({
+                self._queue_update({
                     "type": MessageType.WORKER_STATUS,
                     "action": "disconnected",
                     "worker_id": user_id,
-                    "timestamp": datetime.utcnow().isoformat()
-                }, ["supervisor", "admin"])
+                    "timestamp": now_iso()
+                }, "worker_status_batch", [("staff", None)])
             
             logger.info(f"User {user_id} ({user_role}) disconnected from WebSocket")
             
@@ -161,6 +342,7 @@ class ConnectionManager:
         if room_name not in self.rooms:
             self.rooms[room_name] = set()
         self.rooms[room_name].add(websocket)
+        self.ws_rooms.setdefault(websocket, set()).add(room_name)
 
     async def leave_room(self, websocket: WebSocket, room_name: str):
         """Remove a WebSocket connection from a specific room"""
@@ -168,83 +350,201 @@ class ConnectionManager:
             self.rooms[room_name].discard(websocket)
             if not self.rooms[room_name]:
                 del self.rooms[room_name]
+        joined = self.ws_rooms.get(websocket)
+        if joined is not None:
+            joined.discard(room_name)
 
-    async def send_personal_message(self, message: Dict[str, Any], websocket: WebSocket):
-        """Send a message to a specific WebSocket connection"""
+    async def _writer(self, websocket: WebSocket):
+        """Send queued messages for a connection until it is disconnected
+
+        After waiting for one message, everything else already queued is
+        drained too. Connections that opted into batching get the drained
+        text messages in one frame, so bursts cost one send; others get one
+        frame per message. Compressed (bytes) payloads are always sent as
+        their own binary frames.
+        """
+        queue = self.out_queues[websocket]
+        batching = websocket in self.batching_connections
         try:
-            await websocket.send_text(json.dumps(message))
-            
-            # Update last activity
-            if websocket in self.connection_metadata:
-                self.connection_metadata[websocket]["last_activity"] = datetime.utcnow()
+            while True:
+                batch = [await queue.get()]
+                while queue.qsize() and len(batch) < MAX_BATCH_MESSAGES:
+                    batch.append(queue.get_nowait())
                 
-        except WebSocketDisconnect:
+                if not batching:
+                    for payload in batch:
+                        if isinstance(payload, bytes):
+                            await websocket.send_bytes(payload)
+                        else:
+                            await websocket.send_text(payload)
+                    continue
+                
+                texts = []
+                for payload in batch:
+                    if isinstance(payload, bytes):
+                        if texts:
+                            await websocket.send_text(batch_frame(texts))
+                            texts = []
+                        await websocket.send_bytes(payload)
+                    else:
+                        texts.append(payload)
+                if texts:
+                    await websocket.send_text(batch_frame(texts))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"WebSocket writer stopped: {str(e)}")
             await self.disconnect(websocket)
+
+    def _binary_variant(self, websocket: WebSocket, payload: str, variants: Dict[str, Optional[bytes]]) -> Optional[bytes]:
+        """Binary form of a payload for a connection that opted into one
+
+        Returns None when the connection should get the JSON text frame.
+        Variants are built once and cached in ``variants`` so a broadcast
+        converts the payload at most once per format.
+        """
+        if websocket in self.msgpack_connections:
+            kind = "msgpack"
+        elif websocket in self.deflate_connections:
+            kind = "deflate"
+        else:
+            return None
+        
+        if kind not in variants:
+            if kind == "msgpack":
+                variants[kind] = ormsgpack.packb(orjson.loads(payload))
+            else:
+                variants[kind] = compress_payload(payload)
+        return variants[kind]
+
+    def _enqueue(self, payload: str, websocket: WebSocket, variants: Optional[Dict[str, Optional[bytes]]] = None, touch: bool = True, droppable: bool = False):
+        """Queue an already encoded payload for a connection's writer
+
+        Broadcasts share one ``variants`` cache across recipients, and pass
+        touch=False so fan-out does not write every connection's
+        last_activity. Droppable payloads are silently discarded when the
+        queue is full instead of disconnecting the client.
+        """
+        queue = self.out_queues.get(websocket)
+        if queue is None:
+            return
+        
+        binary = self._binary_variant(websocket, payload, {} if variants is None else variants)
+        if binary is not None:
+            payload = binary
+        
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            if droppable:
+                return
+            
+            # The client is not keeping up; stop queueing for it and drop it
+            # rather than buffering without bound
+            user_id = self.connection_metadata.get(websocket, {}).get("user_id", "unknown")
+            logger.warning(f"Slow client {user_id}, disconnecting")
+            self.out_queues.pop(websocket, None)
+            task = asyncio.create_task(self._drop_slow_client(websocket))
+            self._drop_tasks.add(task)
+            task.add_done_callback(self._drop_tasks.discard)
+            return
+        
+        # Update last activity
+        if touch:
+            self.touch(websocket)
+
+    def touch(self, websocket: WebSocket):
+        """Record activity on a connection so cleanup does not reap it"""
+        conn_id = self.conn_ids.get(websocket)
+        if conn_id is not None:
+            self.last_activity_by_conn[conn_id] = time.monotonic()
+
+    async def _drop_slow_client(self, websocket: WebSocket):
+        """Disconnect a client whose outbound queue overflowed"""
+        await self.disconnect(websocket)
+        try:
+            await websocket.close(code=1011)
         except Exception as e:
-            logger.error(f"Error sending personal message: {str(e)}")
+            logger.info(f"Error closing slow client: {str(e)}")
 
-    async def send_to_user(self, message: Dict[str, Any], user_id: int, user_role: str):
-        """Send a message to a specific user by ID and role"""
+    async def send_personal_message(self, message: Message, websocket: WebSocket):
+        """Queue a message for a specific WebSocket connection"""
         try:
-            if user_role in self.active_connections and user_id in self.active_connections[user_role]:
-                websocket = self.active_connections[user_role][user_id]
-                await self.send_personal_message(message, websocket)
+            self._enqueue(encode_message(message), websocket)
         except Exception as e:
-            logger.error(f"Error sending message to user {user_id}: {str(e)}")
+            logger.error(f"Error sending personal message: {str(e)}")
+
+    async def send_to_user(self, message: Message, user_id: int, user_role: str):
+        """Send a message to a specific user by ID and role"""
+        websocket = self.active_connections.get(user_role, _NO_CONNECTIONS).get(user_id)
+        if websocket is not None:
+            self._enqueue(encode_message(message), websocket)
 
-    async def broadcast_to_room(self, message: Dict[str, Any], room_name: str):
+    async def broadcast_to_room(self, message: Message, room_name: str):
         """Broadcast a message to all connections in a specific room"""
         if room_name not in self.rooms:
             return
         
-        disconnected_connections = []
-        
-        for websocket in self.rooms[room_name].copy():
-            try:
-                await self.send_personal_message(message, websocket)
-            except WebSocketDisconnect:
-                disconnected_connections.append(websocket)
-            except Exception as e:
-                logger.error(f"Error broadcasting to room {room_name}: {str(e)}")
-                disconnected_connections.append(websocket)
+        payload = encode_message(message)
+        variants = {}
+        for websocket in self.rooms[room_name]:
+            self._enqueue(payload, websocket, variants, touch=False)
+
+    async def broadcast_preencoded(self, payload: str, target_roles: Optional[List[str]] = None):
+        """Queue one encoded payload for every user in the given roles, or all users
+
+        The payload is serialized once by the caller and the same immutable
+        string is handed to every connection's queue; it is also converted
+        at most once for connections that opted into deflate or MessagePack.
+        """
+        self._fan_out(payload, target_roles)
+
+    def _fan_out(self, payload: str, target_roles: Optional[List[str]] = None, droppable: bool = False):
+        # _enqueue never awaits and never removes connections itself (slow
+        # clients are dropped from a separate task), so the connection
+        # maps can be iterated directly without copying them first
+        variants = {}
+        if not target_roles:
+            for websocket in self.connection_metadata:
+                self._enqueue(payload, websocket, variants, touch=False, droppable=droppable)
+            return
         
-        # Clean up disconnected connections
-        for websocket in disconnected_connections:
-            await self.disconnect(websocket)
+        for role in target_roles:
+            for websocket in self.active_connections.get(role, _NO_CONNECTIONS).values():
+                self._enqueue(payload, websocket, variants, touch=False, droppable=droppable)
+
+    def broadcast_sync(self, message: Message, target_roles: Optional[List[str]] = None):
+        """Best-effort broadcast for low-priority messages, without awaiting
+
+        The message is encoded once and queued for each recipient; clients
+        whose queue is full simply miss it and are not disconnected.
+        """
+        self._fan_out(encode_message(message), target_roles, droppable=True)
+
+    def _fan_out_group(self, payload: str, group: str):
+        variants = {}
+        for websocket in self._role_groups.get(group, ()):
+            self._enqueue(payload, websocket, variants, touch=False)
 
-    async def broadcast_to_roles(self, message: Dict[str, Any], roles: List[str]):
+    async def broadcast_to_group(self, message: Message, group: str):
+        """Broadcast a message to every connection in a role group (see ROLE_GROUPS)"""
+        self._fan_out_group(encode_message(message), group)
+
+    async def broadcast_to_roles(self, message: Message, roles: List[str]):
         """Broadcast a message to all users with specific roles"""
-        for role in roles:
-            if role in self.active_connections:
-                for websocket in list(self.active_connections[role].values()):
-                    try:
-                        await self.send_personal_message(message, websocket)
-                    except Exception as e:
-                        logger.error(f"Error broadcasting to role {role}: {str(e)}")
-
-    async def broadcast_to_all(self, message: Dict[str, Any]):
+        if roles:
+            await self.broadcast_preencoded(encode_message(message), roles)
+
+    async def broadcast_to_all(self, message: Message):
         """Broadcast a message to all connected users"""
-        all_connections = []
-        for role_connections in self.active_connections.values():
-            all_connections.extend(role_connections.values())
-        
-        disconnected_connections = []
-        
-        for websocket in all_connections:
-            try:
-                await self.send_personal_message(message, websocket)
-            except WebSocketDisconnect:
-                disconnected_connections.append(websocket)
-            except Exception as e:
-                logger.error(f"Error broadcasting to all: {str(e)}")
-                disconnected_connections.append(websocket)
-        
-        # Clean up disconnected connections
-        for websocket in disconnected_connections:
-            await self.disconnect(websocket)
+        await self.broadcast_preencoded(encode_message(message))
 
     def get_connected_users(self, role: Optional[str] = None) -> Dict[str, Any]:
-        """Get information about connected users"""
+        """Get information about connected users
+
+        The all-roles summary is cached between connection changes; callers
+        must not modify the returned dict.
+        """
         if role:
             return {
                 "role": role,
@@ -252,7 +552,10 @@ class ConnectionManager:
                 "users": list(self.active_connections.get(role, {}).keys())
             }
         
-        return {
+        if self._summary_cache is not None:
+            return self._summary_cache
+        
+        self._summary_cache = {
             "total": self.connection_stats["total_connections"],
             "by_role": {
                 role: {
@@ -261,105 +564,135 @@ class ConnectionManager:
                 }
                 for role, connections in self.active_connections.items()
             },
-            "statistics": self.connection_stats
+            "statistics": {
+                **self.connection_stats,
+                "last_activity": datetime.utcfromtimestamp(self.connection_stats["last_activity"]).isoformat()
+            }
         }
+        return self._summary_cache
+
+    def _queue_update(self, message: Message, batch_type: str, targets: List[Tuple[str, Optional[int]]]):
+        """Hold an update for the coalescing window before sending it"""
+        for role, user_id in targets:
+            self.pending_updates.setdefault((batch_type, role, user_id), []).append(message)
+        
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(UPDATE_COALESCE_SECONDS, self._flush_updates)
+
+    def _flush_updates(self):
+        """Send held updates, one frame per target
+
+        A lone update goes out unchanged; several are wrapped in a batch
+        message. Targets holding the same updates share one encoded payload.
+        """
+        self._flush_handle = None
+        pending, self.pending_updates = self.pending_updates, {}
+        payloads: Dict[Tuple[int, ...], str] = {}
+        
+        for (batch_type, role, user_id), items in pending.items():
+            try:
+                item_ids = tuple(map(id, items))
+                payload = payloads.get(item_ids)
+                if payload is None:
+                    if len(items) == 1:
+                        payload = encode_message(items[0])
+                    else:
+                        payload = encode_message({
+                            "type": batch_type,
+                            "items": items,
+                            "timestamp": now_iso()
+                        })
+                    payloads[item_ids] = payload
+                
+                if user_id is None:
+                    self._fan_out_group(payload, role)
+                else:
+                    websocket = self.active_connections.get(role, _NO_CONNECTIONS).get(user_id)
+                    if websocket is not None:
+                        self._enqueue(payload, websocket, touch=False)
+            except Exception as e:
+                logger.error(f"Error flushing {batch_type} for {role}: {str(e)}")
 
     async def send_task_update(self, task_data: Dict[str, Any]):
         """Send task update to relevant users"""
-        message = {
-            "type": MessageType.TASK_UPDATE,
-            "data": task_data,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        message = DataMessage(MessageType.TASK_UPDATE, task_data, now_iso())
+        
+        # Send to supervisors and admins
+        targets = [("staff", None)]
         
         # Send to assigned worker
         if "worker_id" in task_data:
-            await self.send_to_user(message, task_data["worker_id"], "worker")
+            targets.append(("worker", task_data["worker_id"]))
         
-        # Send to supervisors and admins
-        await self.broadcast_to_roles(message, ["supervisor", "admin"])
+        self._queue_update(message, "task_update_batch", targets)
 
     async def send_order_status_update(self, order_data: Dict[str, Any]):
         """Send order status update to relevant users"""
-        message = {
-            "type": MessageType.ORDER_STATUS,
-            "data": order_data,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        message = DataMessage(MessageType.ORDER_STATUS, order_data, now_iso())
         
         # Send to all supervisors and admins
-        await self.broadcast_to_roles(message, ["supervisor", "admin"])
+        targets = [("staff", None)]
         
         # Send to worker if assigned
         if "assigned_worker_id" in order_data:
-            await self.send_to_user(message, order_data["assigned_worker_id"], "worker")
+            targets.append(("worker", order_data["assigned_worker_id"]))
+        
+        self._queue_update(message, "order_status_batch", targets)
 
     async def send_alert(self, alert_data: Dict[str, Any], level: AlertLevel = AlertLevel.INFO, target_roles: List[str] = None):
         """Send alert to specified roles or all users"""
-        message = {
-            "type": MessageType.ALERT,
-            "level": level,
-            "data": alert_data,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        message = AlertMessage(MessageType.ALERT, level, alert_data, now_iso())
         
-        if target_roles:
-            await self.broadcast_to_roles(message, target_roles)
-        else:
-            await self.broadcast_to_all(message)
+        await self.broadcast_preencoded(encode_message(message), target_roles)
 
     async def send_supervisor_alert(self, alert_data: Dict[str, Any], level: AlertLevel = AlertLevel.WARNING):
         """Send alert specifically to supervisors and admins"""
-        message = {
-            "type": MessageType.SUPERVISOR_ALERT,
-            "level": level,
-            "data": alert_data,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        message = AlertMessage(MessageType.SUPERVISOR_ALERT, level, alert_data, now_iso())
         
-        await self.broadcast_to_roles(message, ["supervisor", "admin"])
+        await self.broadcast_to_group(message, "staff")
 
     async def send_notification(self, notification_data: Dict[str, Any], user_id: int = None, user_role: str = None, target_roles: List[str] = None):
         """Send notification to specific user or roles"""
-        message = {
-            "type": MessageType.NOTIFICATION,
-            "data": notification_data,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        message = DataMessage(MessageType.NOTIFICATION, notification_data, now_iso())
         
         if user_id and user_role:
             await self.send_to_user(message, user_id, user_role)
-        elif target_roles:
-            await self.broadcast_to_roles(message, target_roles)
+        elif user_id:
+            websocket = self.by_user_id.get(user_id)
+            if websocket is not None:
+                self._enqueue(encode_message(message), websocket)
         else:
-            await self.broadcast_to_all(message)
+            await self.broadcast_preencoded(encode_message(message), target_roles)
 
     async def handle_heartbeat(self, websocket: WebSocket):
         """Handle heartbeat/ping messages to keep connection alive"""
-        try:
-            await self.send_personal_message({
-                "type": "pong",
-                "timestamp": datetime.utcnow().isoformat()
-            }, websocket)
-        except Exception as e:
-            logger.error(f"Error handling heartbeat: {str(e)}")
+        self._enqueue(PONG_FRAME, websocket, droppable=True)
 
     async def cleanup_inactive_connections(self, timeout_minutes: int = 30):
         """Clean up connections that have been inactive for too long"""
-        cutoff_time = datetime.utcnow().timestamp() - (timeout_minutes * 60)
-        inactive_connections = []
+        cutoff_time = time.monotonic() - (timeout_minutes * 60)
+        ws_by_id = self.ws_by_id
+        inactive_connections = [
+            ws_by_id[conn_id]
+            for conn_id, last_activity in self.last_activity_by_conn.items()
+            if last_activity < cutoff_time
+        ]
         
-        for websocket, metadata in self.connection_metadata.items():
-            if metadata["last_activity"].timestamp() < cutoff_time:
-                inactive_connections.append(websocket)
-        
-        for websocket in inactive_connections:
-            try:
-                await websocket.close()
-                await self.disconnect(websocket)
-                logger.info(f"Cleaned up inactive connection for user {self.connection_metadata.get(websocket, {}).get('user_id', 'unknown')}")
-            except Exception as e:
-                logger.error(f"Error cleaning up inactive connection: {str(e)}")
+        # Close them concurrently so one unresponsive client does not hold
+        # up the rest of the sweep
+        await asyncio.gather(
+            *(self._close_inactive(websocket) for websocket in inactive_connections),
+            return_exceptions=True
+        )
+
+    async def _close_inactive(self, websocket: WebSocket):
+        user_id = self.connection_metadata.get(websocket, {}).get("user_id", "unknown")
+        try:
+            await websocket.close()
+            await self.disconnect(websocket)
+            logger.info(f"Cleaned up inactive connection for user {user_id}")
+        except Exception as e:
+            logger.error(f"Error cleaning up inactive connection: {str(e)}")
 
 # Global connection manager instance
 connection_manager = ConnectionManager()
@@ -394,16 +727,16 @@ async def notify_compliance_issue(issue_data: Dict[str, Any]):
 
 async def notify_system_status(status_data: Dict[str, Any], level: AlertLevel = AlertLevel.INFO):
     """Send system status updates to all users"""
-    await connection_manager.send_alert({
+    connection_manager.broadcast_sync(AlertMessage(MessageType.ALERT, level, {
         "type": "system_status",
         "message": "System status update",
         "details": status_data
-    }, level)
+    }, now_iso()))
 
 async def broadcast_maintenance_notice(notice: str, scheduled_time: str = None):
     """Broadcast maintenance notices to all users"""
-    await connection_manager.send_notification({
+    connection_manager.broadcast_sync(DataMessage(MessageType.NOTIFICATION, {
         "type": "maintenance_notice",
         "message": notice,
         "scheduled_time": scheduled_time
-    })
+    }, now_iso()))